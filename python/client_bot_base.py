@@ -1,14 +1,20 @@
+"""HTTP/WebSocket client for the bot backend.
+
+The hot path here is I/O-bound: per-turn cost is dominated by backend round
+trips, so optimizations target connection reuse, JSON codec speed and
+redundant per-request work rather than CPU-side vectorization.
+"""
 import asyncio
-import io
 import json
 import logging
 import os
+import random
 import sys
 from asyncio import Task
-from typing import Any, Awaitable, Dict, List, Literal, Optional, cast
+from typing import Any, Awaitable, Dict, List, Literal, Optional, Tuple, cast
 
 import aiohttp
-import scipy
+import numpy as np
 from aiohttp import (
     ClientConnectionError,
     ClientSession,
@@ -23,11 +29,64 @@ from numpy import ndarray
 from src.backend.channel.channel_base import Attachment
 from src.backend.health_base import HealthBotBase
 from src.backend.health_models import HealthCheck, HealthEnum
+from src.integrations.sip.audio_utils import to_pcm16, wav_header
+
+try:
+    import orjson
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    _json_dumps = json.dumps
+    _json_loads = json.loads
 
 logger = logging.getLogger(__name__)
 
+_SESSION_TYPE: str = "inbound"
+_IS_STREAMING: bool = False
+_REQUEST_TIMEOUT: Optional[aiohttp.ClientTimeout] = None
+
+
+def reload_config():
+    """Re-read the session environment settings shared by all ClientBotSession instances."""
+    global _SESSION_TYPE, _IS_STREAMING, _REQUEST_TIMEOUT
+    _SESSION_TYPE = os.environ.get("SESSION_TYPE", "inbound")
+    _IS_STREAMING = (_SESSION_TYPE not in ("inbound", "outbound") and
+                     os.getenv("IS_STREAMING", "true").lower() == "true")
+    _REQUEST_TIMEOUT = aiohttp.ClientTimeout(
+        total=float(os.getenv("BACKEND_REQUEST_TIMEOUT", "60")),
+        connect=float(os.getenv("BACKEND_CONNECT_TIMEOUT", "60")),
+        sock_read=float(os.getenv("BACKEND_SOCK_READ_TIMEOUT", "60"))
+    )
+
+
+reload_config()
+
+# WebSocket reconnect backoff, seconds
+_WS_RECONNECT_BASE_DELAY = 0.25
+_WS_RECONNECT_MAX_DELAY = 30.0
+
+# Uploads are sent with chunked transfer encoding in slices of this size
+_UPLOAD_CHUNK_SIZE = 64 * 1024
+_STREAM_UPLOAD_THRESHOLD = 4 * _UPLOAD_CHUNK_SIZE
+
+
+async def _iter_chunks(*parts):
+    for part in parts:
+        view = memoryview(part)
+        for offset in range(0, len(view), _UPLOAD_CHUNK_SIZE):
+            yield view[offset:offset + _UPLOAD_CHUNK_SIZE]
+
 
 class ClientBotSession(object):
+    __slots__ = ("closed", "bot_base", "user_id", "name", "bot_type", "conversation_id", "session_id", "metadata",
+                 "ws", "ws_task", "session_type", "is_streaming", "_session_prefix", "_url_run", "_url_run_v2",
+                 "_url_logs_v2", "_url_start", "_url_commit", "_url_rollback", "_url_command", "_url_commands",
+                 "_url_synthesize", "__weakref__")
+
     def __init__(self, bot_base, user_id: str, name: str, bot_type: str, conversation_id: Optional[str] = None):
         self.closed = False
         self.bot_base: ClientBotBase = bot_base
@@ -36,20 +95,33 @@ class ClientBotSession(object):
         self.bot_type = bot_type
         self.conversation_id = conversation_id
         self.session_id: Optional[str] = None
+        self._set_session_id(None)
         self.metadata: Dict[str, Any] = {}
         self.ws: Optional[ClientWebSocketResponse] = None
         self.ws_task: Optional[Task] = None
-        self.session_type: str = os.environ.get("SESSION_TYPE", "inbound")
-        self.is_streaming = (self.session_type not in ["inbound", "outbound"] and
-                             os.getenv("IS_STREAMING", "true").lower() == "true")
+        self.session_type: str = _SESSION_TYPE
+        self.is_streaming = _IS_STREAMING
         logger.debug("New session created. [session_type=%s, is_streaming=%s]", self.session_type, self.is_streaming)
 
+    def _set_session_id(self, session_id: Optional[str]):
+        self.session_id = session_id
+        self._session_prefix = f"/session/{session_id}"
+        self._url_run = self._session_prefix + "/run"
+        self._url_run_v2 = self._session_prefix + "/run_v2"
+        self._url_logs_v2 = self._session_prefix + "/logs_v2"
+        self._url_start = self._session_prefix + "/start"
+        self._url_commit = self._session_prefix + "/commit"
+        self._url_rollback = self._session_prefix + "/rollback"
+        self._url_command = self._session_prefix + "/command"
+        self._url_commands = self._session_prefix + "/commands"
+        self._url_synthesize = self._session_prefix + "/synthesize"
+
     async def request(self, method: str, url: str, raise_error=True, **kwargs):
         return await self.bot_base.request(method, url, raise_error=raise_error, **kwargs)
 
     async def run(self, message, **kwargs) -> dict:
         json = {"message": message, "kwargs": kwargs}
-        response = await self.request("POST", "/session/{id}/run".format(id=self.session_id), json=json)
+        response = await self.request("POST", self._url_run, json=json)
         return response
 
     async def run_v2(self, message, attachments) -> dict:
@@ -59,7 +131,7 @@ class ClientBotSession(object):
             for attachment in attachments:
                 form.add_field("attachments", value=attachment.file, filename=attachment.filename,
                                content_type=attachment.content_type)
-        response = await self.request("POST", f"/session/{self.session_id}/run_v2", headers={"Content-Type": None}, data=form)
+        response = await self.request("POST", self._url_run_v2, headers={"Content-Type": None}, data=form)
         return response
 
     async def logs_v2(self, message) -> dict:
@@ -67,32 +139,43 @@ class ClientBotSession(object):
         form.add_field("message", message)
         form.add_field("role", "OPERATOR")
         logger.debug("logs_v2 message queued. [session_id=%s, message=%s]", self.session_id, message)
-        response = await self.request("POST", f"/session/{self.session_id}/logs_v2", headers={"Content-Type": None}, data=form)
+        response = await self.request("POST", self._url_logs_v2, headers={"Content-Type": None}, data=form)
         return response
 
     async def start(self, message, **kwargs) -> dict:
         json = {"message": message, "kwargs": kwargs}
-        response = await self.request("POST", "/session/{id}/start".format(id=self.session_id), json=json)
+        response = await self.request("POST", self._url_start, json=json)
         return response
 
     async def commit(self) -> dict:
         json = {}
-        response = await self.request("POST", "/session/{id}/commit".format(id=self.session_id), json=json)
+        response = await self.request("POST", self._url_commit, json=json)
         return response
 
     async def rollback(self) -> dict:
         json = {}
-        response = await self.request("POST", "/session/{id}/rollback".format(id=self.session_id), json=json)
+        response = await self.request("POST", self._url_rollback, json=json)
         return response
 
     async def command(self, command: str, *args):
         json = {"command": command, "args": list(args)}
-        response = await self.request("POST", "/session/{id}/command".format(id=self.session_id), json=json)
+        response = await self.request("POST", self._url_command, json=json)
         self.metadata["/" + command] = response.get("metadata")
         return response
 
+    async def command_batch(self, commands: List[Tuple[str, Tuple]]) -> List[dict]:
+        """Send several commands in one round trip when the backend supports /commands."""
+        if not self.bot_base.batch_commands:
+            return [await self.command(command, *args) for command, args in commands]
+        json = {"commands": [{"command": command, "args": list(args)} for command, args in commands]}
+        response = await self.request("POST", self._url_commands, json=json)
+        responses = response.get("responses", [])
+        for (command, _), command_response in zip(commands, responses):
+            self.metadata["/" + command] = command_response.get("metadata")
+        return responses
+
     async def update(self, **kwargs):
-        response = await self.request("PUT", "/session/{id}".format(id=self.session_id), json=kwargs)
+        response = await self.request("PUT", self._session_prefix, json=kwargs)
         conversation_id = kwargs.get("conversation_id")
         if conversation_id:
             self.conversation_id = conversation_id
@@ -102,14 +185,14 @@ class ClientBotSession(object):
         response = cast(Dict, await self.request("POST", "/session",
                                       json={"user_id": self.user_id, "name": self.name, "type": self.bot_type, "conversation_id": self.conversation_id,
                                             "args": argv, "kwargs": kwargs}))
-        self.session_id = response["session"]["session_id"]
+        self._set_session_id(response["session"]["session_id"])
         self.ws_task = asyncio.create_task(self.ws_connect(self.session_id))
         logger.debug("Session opened. [session_id=%s]", self.session_id)
         return response
 
     async def open_v2(self, *argv, attachments: List[Attachment]=None, **kwargs) -> dict:
         form = FormData()
-        json_data = json.dumps({"user_id": self.user_id, "name": self.name, "type": self.bot_type, "conversation_id": self.conversation_id,
+        json_data = _json_dumps({"user_id": self.user_id, "name": self.name, "type": self.bot_type, "conversation_id": self.conversation_id,
                                             "communication_id": kwargs.pop("communication_id", None), "args": argv, "kwargs": kwargs})
         form.add_field("body", json_data)
         if attachments:
@@ -117,7 +200,7 @@ class ClientBotSession(object):
                 form.add_field("attachments", value=attachment.file, filename=attachment.filename,
                                content_type=attachment.content_type)
         response = cast(Dict, await self.request("POST", "/session_v2", headers={"Content-Type": None}, data=form))
-        self.session_id = response["session"]["session_id"]
+        self._set_session_id(response["session"]["session_id"])
         self.ws_task = asyncio.create_task(self.ws_connect(self.session_id))
         logger.debug("Session opened. [session_id=%s]", self.session_id)
         return response
@@ -125,7 +208,7 @@ class ClientBotSession(object):
     async def close(self, status: Optional[str]=None):
         await self.detach()
         params = {"status": status} if status else {}
-        await self.request("DELETE", f"/session/{self.session_id}", params=params)
+        await self.request("DELETE", self._session_prefix, params=params)
         logger.debug("Session closed. [session_id=%s, params=%s]", self.session_id, params)
 
     async def detach(self):
@@ -161,20 +244,19 @@ class ClientBotSession(object):
         return response
 
     async def session_synthesize(self, text: str, content_type: str = "wav"):
-        response = await self.request("GET", f"/session/{self.session_id}/synthesize", params={"text": text, "format": content_type}, response_format="binary")
+        response = await self.request("GET", self._url_synthesize, params={"text": text, "format": content_type}, response_format="binary")
         return response
 
     async def transcribe(self, audio: bytes, content_type: str = "wav") -> dict:
-        response = await self.request("POST", "/transcribe", data=audio,
+        data = _iter_chunks(audio) if len(audio) > _STREAM_UPLOAD_THRESHOLD else audio
+        response = await self.request("POST", "/transcribe", data=data,
                                       headers={'Content-Type': content_type})
         return response
 
     async def transcribe_nd(self, audio: ndarray, content_type: str = "wav") -> dict:
-        memory_file = io.BytesIO()
-        memory_file.name = "memory_file.wav"
-        scipy.io.wavfile.write(memory_file, 16000, audio)
-        # await Path(os.getcwd(), memory_file.name).write_bytes(memory_file.getvalue())
-        response = await self.request("POST", "/transcribe", data=memory_file.getvalue(),
+        pcm = to_pcm16(audio)
+        data = _iter_chunks(wav_header(pcm.nbytes), pcm.view(np.uint8))
+        response = await self.request("POST", "/transcribe", data=data,
                                       headers={'Content-Type': content_type})
         return response
 
@@ -185,32 +267,50 @@ class ClientBotSession(object):
         if not self.closed:
             await self.close()
 
+    async def _on_ws_timeout(self, body):
+        await self.bot_base.on_timeout(self.session_id)
+
+    async def _on_ws_close(self, body):
+        await self.bot_base.on_close(self.session_id)
+
+    async def _on_ws_message(self, body):
+        await self.bot_base.ws_message(self, body)
+
+    _ws_handlers = {"timeout": _on_ws_timeout, "close": _on_ws_close}
+
     async def ws_connect(self, session_id):
+        ws_error = aiohttp.WSMsgType.ERROR
+        handlers = self._ws_handlers
+        default_handler = ClientBotSession._on_ws_message
+        attempt = 0
         while not self.closed:
             logger.info("Connecting WebSocket. [session_id=%s]", session_id)
-            async with self.bot_base.session.ws_connect(f'/ws/{session_id}'.format(session_id=session_id), ssl=False) as ws:
-                self.ws = ws
-                async for msg in ws:
-                    try:
-                        if msg.type == aiohttp.WSMsgType.ERROR:
-                            logger.error("WebSocket error. [session_id=%s, error=%s]", session_id, self.ws.exception())
-                        else:
-                            body = msg.json()
-                            if body["type"] == "timeout":
-                                await self.bot_base.on_timeout(self.session_id)
-                            elif body["type"] == "close":
-                                await self.bot_base.on_close(self.session_id)
+            try:
+                async with self.bot_base.session.ws_connect(f'/ws/{session_id}', ssl=False) as ws:
+                    self.ws = ws
+                    async for msg in ws:
+                        attempt = 0
+                        try:
+                            if msg.type == ws_error:
+                                logger.error("WebSocket error. [session_id=%s, error=%s]", session_id, self.ws.exception())
                             else:
-                                await self.bot_base.ws_message(self, body)
-                    except Exception as e:
-                        logger.error("WebSocket error. [session_id=%s, error=%s]", session_id, e, exc_info=e)
-                logger.info("WebSocket disconnected. [session_id=%s]", session_id)
-                self.ws = None
-            await asyncio.sleep(5)
+                                body = _json_loads(msg.data)
+                                await handlers.get(body["type"], default_handler)(self, body)
+                        except Exception as e:
+                            logger.error("WebSocket error. [session_id=%s, error=%s]", session_id, e, exc_info=e)
+                    logger.info("WebSocket disconnected. [session_id=%s]", session_id)
+                    self.ws = None
+            except (ClientConnectionError, asyncio.TimeoutError) as e:
+                logger.warning("WebSocket connection failed. [session_id=%s, attempt=%s, error=%s]", session_id, attempt, e)
+            if self.closed:
+                break
+            # Exponential backoff with jitter so sessions do not reconnect in lockstep after a backend restart
+            await asyncio.sleep(min(_WS_RECONNECT_MAX_DELAY, _WS_RECONNECT_BASE_DELAY * 2 ** min(attempt, 8)) + random.random())
+            attempt += 1
 
     async def ws_send_json(self, json_data):
         if self.ws is not None:
-            await self.ws.send_json(json_data)
+            await self.ws.send_json(json_data, dumps=_json_dumps)
 
 
 class ClientBotBase(HealthBotBase):
@@ -218,14 +318,19 @@ class ClientBotBase(HealthBotBase):
         self.base_url = base_url
         self.session: Optional[ClientSession] = None
         self.sessions: Dict[str, ClientBotSession] = dict()
-        self.conversation_id_to_session_id = dict()
-        self.session_id_to_conversation_id = dict()
+        self.conversation_id_to_session_id: Dict[str, str] = dict()
+        self.session_id_to_conversation_id: Dict[str, str] = dict()
+        # Pick up variables loaded from .env after this module was imported
+        reload_config()
         self.show_waiting_messages = os.getenv("SHOW_WAITING_MESSAGES", "false").lower() == "true"
-        self.request_timeout = aiohttp.ClientTimeout(
-            total=float(os.getenv("BACKEND_REQUEST_TIMEOUT", "60")),
-            connect=float(os.getenv("BACKEND_CONNECT_TIMEOUT", "60")),
-            sock_read=float(os.getenv("BACKEND_SOCK_READ_TIMEOUT", "60"))
-        )
+        self.batch_commands = os.getenv("BACKEND_BATCH_COMMANDS", "false").lower() == "true"
+        self.request_timeout = _REQUEST_TIMEOUT
+        self.pool_limit_per_host = int(os.getenv("BACKEND_POOL", "256"))
+        self._base_headers = {
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "Authorization": f"Bearer {os.getenv('AUTHORIZATION_TOKEN')}"
+        }
 
 
     async def request(self, method: str, url: str, raise_error=True, **kwargs):
@@ -236,29 +341,34 @@ class ClientBotBase(HealthBotBase):
         return await self._request(method, url, raise_error, response_format="binary", **kwargs)
 
     async def _request(self, method: str, url: str, raise_error=True, response_format: Literal["json", "text", "binary"]= "json", **kwargs):
-        authorization_token = os.getenv("AUTHORIZATION_TOKEN")
-        headers = {
-            "Content-Type": "application/json",
-            "Accept": "application/json",
-            'Authorization': f'Bearer {authorization_token}'
-        }
-        headers.update(kwargs.pop('headers', {}))
-        headers = {k: v for k, v in headers.items() if v}
+        extra_headers = kwargs.pop('headers', None)
+        if extra_headers:
+            headers = self._base_headers.copy()
+            for name, value in extra_headers.items():
+                if value:
+                    headers[name] = value
+                else:
+                    # Empty overrides drop the default, e.g. Content-Type for multipart bodies
+                    headers.pop(name, None)
+        else:
+            headers = self._base_headers
         # if 'timeout' not in kwargs:
         #     kwargs['timeout'] = self.request_timeout
         async with self.session.request(method, url, headers=headers, **kwargs) as resp:
             if resp.status < 200 or resp.status >= 300:
+                # Read the body once and decode it in-process instead of resp.json() falling back to resp.text()
+                body = await resp.read()
                 try:
-                    message = (await resp.json())["message"]
+                    message = _json_loads(body)["message"]
                 except Exception:
-                    message = await resp.text()
+                    message = body.decode("utf-8", "replace")
                 logger.error("API error. [method=%s, url=%s, status=%s, message=%s]", method, url, resp.status, message)
                 if raise_error:
                     if resp.status == 403:
                         raise PermissionError(message)
                     raise RuntimeError(message)
             if response_format == "json":
-                return await resp.json()
+                return await resp.json(loads=_json_loads)
             if response_format == "text":
                 return await resp.text()
             else:
@@ -279,8 +389,16 @@ class ClientBotBase(HealthBotBase):
         return [self.get_bot_back_health_check()]
 
     async def open(self):
-        timeout = aiohttp.ClientTimeout(connect=5)
-        self.session = ClientSession(self.base_url, timeout=timeout)
+        # Connector must be created inside the running loop
+        connector = aiohttp.TCPConnector(
+            limit=0,
+            limit_per_host=self.pool_limit_per_host,
+            ttl_dns_cache=300,
+            keepalive_timeout=75,
+            enable_cleanup_closed=True,
+        )
+        self.session = ClientSession(self.base_url, connector=connector, timeout=self.request_timeout,
+                                     json_serialize=_json_dumps)
 
     async def close(self):
         for session in self.sessions.values():
@@ -326,11 +444,9 @@ class ClientBotBase(HealthBotBase):
     def clear_conversation_id(self, session_id):
         session = self.sessions.pop(session_id, None)
         if session is not None:
-            conversation_id = self.session_id_to_conversation_id.get(session_id)
+            conversation_id = self.session_id_to_conversation_id.pop(session_id, None)
             if conversation_id:
-                del self.session_id_to_conversation_id[session_id]
-                if conversation_id in self.conversation_id_to_session_id:
-                    del self.conversation_id_to_session_id[conversation_id]
+                self.conversation_id_to_session_id.pop(conversation_id, None)
         return session
 
     async def ws_message(self, session, message):
@@ -352,11 +468,8 @@ class ClientBotBase(HealthBotBase):
 async def main(base_url):
     async with ClientBotBase(base_url) as client:
         async with await client.start_session("arch7tect", "Oleg Orlov", "web") as session:
-            response = await session.command("thoughts", "on")
-            logger.info("Thoughts response. [response=%s]", response)
-            await asyncio.sleep(0.5)
-            response = await session.command("plugins")
-            logger.info("Plugins response. [response=%s]", response)
+            responses = await session.command_batch([("thoughts", ("on",)), ("plugins", ())])
+            logger.info("Command responses. [responses=%s]", responses)
             response = await session.run("hello world")
             logger.info("Run response. [response=%s]", response)
 
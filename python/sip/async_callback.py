@@ -1,17 +1,27 @@
 import asyncio
 import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
 
 import pjsua2 as pj
 
 logger = logging.getLogger(__name__)
 
-# Global reference to the main event loop, set during initialization
-_main_loop = None
+_spawned_tasks = set()
+
+OVERFLOW_WARNING_INTERVAL = 5.0  # seconds between overflow warnings, drops in between are summed
+
+
+def _spawn(coro) -> asyncio.Task:
+    """Create a task on the running loop and keep it referenced until it finishes."""
+    task = asyncio.get_running_loop().create_task(coro)
+    # The loop only keeps weak references to tasks
+    _spawned_tasks.add(task)
+    task.add_done_callback(_spawned_tasks.discard)
+    return task
 
-def set_main_loop(loop):
-    """Set the main event loop to use for scheduling callbacks."""
-    global _main_loop
-    _main_loop = loop
 
 class AsyncCallbackJob:
     def __init__(self, cb, *args, **kwargs):
@@ -26,14 +36,137 @@ class AsyncCallbackJob:
             message = e.reason if hasattr(e, 'reason') else str(e)
             logger.error("Async callback execution failed. [callback=%s, error=%s]", getattr(self.cb, "__name__", type(self.cb).__name__), message, exc_info=e)
 
-    def submit(self):
+    def spawn(self) -> asyncio.Task:
+        """submit() for callers already on the loop thread: a plain task, no cross-thread handoff."""
+        return _spawn(self._safe_execute())
+
+    def submit(self, loop: asyncio.AbstractEventLoop):
         # Schedule the async task directly on the event loop instead of using PJSIP's pending job system
         # This avoids thread registration issues when called from PJSIP's internal media threads
         try:
-            if _main_loop is None:
-                logger.error("Main event loop not set. Call set_main_loop() during initialization. [callback=%s]", getattr(self.cb, "__name__", type(self.cb).__name__))
+            if loop is None:
+                logger.error("Event loop not available, app is not initialized. [callback=%s]", getattr(self.cb, "__name__", type(self.cb).__name__))
                 return
-            # Use call_soon_threadsafe to safely schedule from any thread
-            _main_loop.call_soon_threadsafe(lambda: asyncio.create_task(self._safe_execute()))
+            # run_coroutine_threadsafe is safe to call from any thread and wraps the coroutine in a task on the loop
+            asyncio.run_coroutine_threadsafe(self._safe_execute(), loop)
         except Exception as e:
             logger.error("Failed to schedule async callback. [callback=%s, error=%s]", getattr(self.cb, "__name__", type(self.cb).__name__), str(e))
+
+
+def make_submitter(cb, loop: asyncio.AbstractEventLoop):
+    """Pre-bind a no-argument coroutine function so repeated submits from PJSIP threads allocate no job object."""
+    name = getattr(cb, "__name__", type(cb).__name__)
+    call_soon_threadsafe = loop.call_soon_threadsafe if loop is not None else None
+
+    async def _safe_execute():
+        try:
+            await cb()
+        except BaseException as e:
+            message = e.reason if hasattr(e, 'reason') else str(e)
+            logger.error("Async callback execution failed. [callback=%s, error=%s]", name, message, exc_info=e)
+
+    def submit():
+        if call_soon_threadsafe is None:
+            logger.error("Event loop not available, app is not initialized. [callback=%s]", name)
+            return
+        try:
+            call_soon_threadsafe(_spawn, _safe_execute())
+        except Exception as e:
+            logger.error("Failed to schedule async callback. [callback=%s, error=%s]", name, str(e))
+
+    return submit
+
+
+class AsyncCallbackQueue:
+    """Hands callbacks from PJSIP threads to the loop, waking it once per batch instead of once per callback.
+
+    call_soon_threadsafe writes to the loop's self-pipe on every call; here only the submit that finds
+    the queue idle does, and a single loop callback runs everything queued by then. Coroutine results
+    are scheduled as tasks. Per-frame work submitted with submit_frame is bounded: on overflow the
+    oldest frames are dropped, counted and reported through on_overflow. Callbacks submitted with
+    submit, e.g. VAD events, are queued separately and never dropped.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_pending: int = 1024,
+                 on_overflow: Optional[Callable[[int], None]] = None):
+        self._frames: deque = deque(maxlen=max(1, max_pending))
+        self._events: deque = deque()
+        self._lock = threading.Lock()
+        self._scheduled = False
+        self._call_soon_threadsafe = loop.call_soon_threadsafe
+        self._on_overflow = on_overflow
+        self.dropped = 0
+        self._reported = 0
+        self._warned = 0
+        self._last_warning = float('-inf')
+
+    def submit(self, cb, *args):
+        """Queue a callback that must run, whatever the backlog of frames."""
+        self._events.append((cb, args))
+        with self._lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._schedule_drain()
+
+    def submit_frame(self, cb, *args):
+        """Queue per-frame work; if max_pending frames are already waiting, the oldest one is dropped."""
+        frames = self._frames
+        with self._lock:
+            if len(frames) == frames.maxlen:
+                self.dropped += 1
+            frames.append((cb, args))
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._schedule_drain()
+
+    def _schedule_drain(self):
+        try:
+            self._call_soon_threadsafe(self._drain)
+        except Exception as e:
+            logger.error("Failed to schedule callback queue drain. [error=%s]", str(e))
+
+    def _drain(self):
+        # Reset before draining: a submit racing with this drain either lands in it or schedules the next one
+        with self._lock:
+            self._scheduled = False
+            dropped = self.dropped
+        if dropped != self._reported:
+            self._report_overflow(dropped)
+        # Events first: they are few, and the frames behind them may be a backlog
+        self._run(self._events)
+        self._run(self._frames)
+
+    def _run(self, pending: deque):
+        while pending:
+            cb, args = pending.popleft()
+            try:
+                result = cb(*args)
+                if asyncio.iscoroutine(result):
+                    _spawn(self._safe_execute(cb, result))
+            except Exception as e:
+                logger.error("Callback execution failed. [callback=%s, error=%s]",
+                             getattr(cb, "__name__", type(cb).__name__), str(e), exc_info=e)
+
+    def _report_overflow(self, dropped: int):
+        new, self._reported = dropped - self._reported, dropped
+        if self._on_overflow is not None:
+            try:
+                self._on_overflow(new)
+            except Exception as e:
+                logger.error("Callback queue overflow handler failed. [error=%s]", str(e))
+        now = time.monotonic()
+        if now - self._last_warning >= OVERFLOW_WARNING_INTERVAL:
+            logger.warning("Callback queue overflow, oldest frames dropped. [dropped=%s, total_dropped=%s, max_pending=%s]",
+                           dropped - self._warned, dropped, self._frames.maxlen)
+            self._warned = dropped
+            self._last_warning = now
+
+    @staticmethod
+    async def _safe_execute(cb, coro):
+        try:
+            await coro
+        except BaseException as e:
+            message = e.reason if hasattr(e, 'reason') else str(e)
+            logger.error("Async callback execution failed. [callback=%s, error=%s]", getattr(cb, "__name__", type(cb).__name__), message, exc_info=e)
@@ -1,3 +1,11 @@
+"""Queued WAV playback on top of pjsua2 AudioMediaPlayer.
+
+Playback cost is in the hops from PJSIP media threads to the asyncio loop
+and in player/file setup between files, so callbacks are scheduled
+thread-safely with pre-bound submitters and the next player is prepared
+ahead of time.
+"""
+import asyncio
 import logging
 import os
 from collections import deque
@@ -6,7 +14,7 @@ from typing import Any, Optional
 
 import pjsua2 as pj
 
-from src.integrations.sip.async_callback import AsyncCallbackJob
+from src.integrations.sip.async_callback import make_submitter
 
 logger = logging.getLogger(__name__)
 
@@ -15,35 +23,82 @@ class AudioMediaPlayer(pj.AudioMediaPlayer):
     def __init__(self, smart_player: "SmartPlayer"):
         super().__init__()
         self.smart_player = smart_player
+        # Playback epoch this player belongs to; stale EOFs after an interrupt are ignored
+        self._epoch = smart_player._epoch
+        self._submit_eof = make_submitter(self._on_eof, smart_player.loop)
 
     def onEof2(self):
         # Run asynchronously to avoid blocking PJSIP thread
-        AsyncCallbackJob(self.smart_player.on_eof).submit()
+        self._submit_eof()
+
+    async def _on_eof(self):
+        await self.smart_player.on_eof(self)
+
+
+# Linux can hand PJSIP an anonymous in-memory file through /proc/self/fd
+MEMORY_FILES_SUPPORTED = hasattr(os, "memfd_create") and os.path.isdir("/proc/self/fd")
 
 
 class AudioFile:
-    __slots__ = ("filename", "discard")
-    def __init__(self, filename: str, discard: bool):
+    __slots__ = ("filename", "discard", "fd")
+    def __init__(self, filename: str, discard: bool, fd: Optional[int] = None):
         self.filename = filename
         self.discard = discard
+        self.fd = fd  # set for in-memory files, which are released by closing the descriptor
+
+    def release(self):
+        if self.fd is not None:
+            with suppress(OSError):
+                os.close(self.fd)
+            self.fd = None
+        elif self.discard:
+            with suppress(FileNotFoundError):
+                os.remove(self.filename)
 
 
 class SmartPlayer:
-    def __init__(self, aud_med: pj.AudioMedia, wav_recorder: Any, on_stop_cb=None, session_id: Optional[str] = None):
+    __slots__ = ("current_audio", "deque", "aud_med", "player", "_next_player", "_next_filename", "wav_recorder",
+                 "loop", "on_stop_cb", "_tearing_down", "_epoch", "session_id")
+
+    def __init__(self, aud_med: pj.AudioMedia, wav_recorder: Any, loop: asyncio.AbstractEventLoop, on_stop_cb=None,
+                 session_id: Optional[str] = None):
         self.current_audio: Optional[AudioFile] = None
         self.deque = deque()
         self.aud_med: Optional[pj.AudioMedia] = aud_med
         self.player: Optional[AudioMediaPlayer] = None
+        # Player created ahead of time for the head of the queue, not transmitting yet
+        self._next_player: Optional[AudioMediaPlayer] = None
+        self._next_filename: Optional[str] = None
         self.wav_recorder: Optional[pj.AudioMediaRecorder] = wav_recorder
+        self.loop = loop
         self.on_stop_cb = on_stop_cb
         self._tearing_down = False  # prevents double-destroy
+        self._epoch = 0  # bumped on interrupt to invalidate in-flight EOFs
         self.session_id = session_id
 
     def is_active(self) -> bool:
         return self.current_audio is not None or bool(self.deque)
 
     def put_to_queue(self, filename: str, discard: bool = False):
-        self.deque.append(AudioFile(filename, discard))
+        self._enqueue(AudioFile(filename, discard))
+
+    def put_bytes_to_queue(self, wav_bytes: bytes):
+        """Queue a WAV blob without touching the disk; needs MEMORY_FILES_SUPPORTED."""
+        fd = os.memfd_create("tts", os.MFD_CLOEXEC)
+        try:
+            with memoryview(wav_bytes) as view:
+                written = 0
+                while written < len(view):
+                    written += os.write(fd, view[written:])
+        except OSError:
+            os.close(fd)
+            raise
+        self._enqueue(AudioFile(f"/proc/self/fd/{fd}", True, fd))
+
+    def _enqueue(self, audio: AudioFile):
+        self.deque.append(audio)
+        if self.player is not None:
+            self._prepare_next()
 
     def play(self):
         if not self.current_audio and self.deque:
@@ -51,16 +106,15 @@ class SmartPlayer:
 
     def interrupt(self):
         logger.debug("Interrupting queue. [session_id=%s]", self.session_id)
+        self._epoch += 1
         self._tearing_down = True
         try:
             if self.player:
                 self.destroy_player()
+            self._drop_next_player()
             self._discard_current()
             while self.deque:
-                audio = self.deque.popleft()
-                if audio.discard:
-                    with suppress(FileNotFoundError):
-                        os.remove(audio.filename)
+                self.deque.popleft().release()
         finally:
             self._tearing_down = False
 
@@ -86,8 +140,8 @@ class SmartPlayer:
             return
 
         try:
-            self.player = AudioMediaPlayer(self)
-            self.player.createPlayer(af.filename, pj.PJMEDIA_FILE_NO_LOOP)
+            self.player = self._take_player(af.filename)
+            self.player._epoch = self._epoch
             self.player.startTransmit(self.wav_recorder)
             self.player.startTransmit(self.aud_med)
         except pj.Error as e:
@@ -96,8 +150,42 @@ class SmartPlayer:
             self._discard_current()
             if self.deque:
                 self._play_next()
+            return
+        self._prepare_next()
+
+    def _take_player(self, filename: str) -> AudioMediaPlayer:
+        player = self._next_player
+        if player is not None and self._next_filename == filename:
+            self._next_player = None
+            self._next_filename = None
+            return player
+        self._drop_next_player()
+        player = AudioMediaPlayer(self)
+        player.createPlayer(filename, pj.PJMEDIA_FILE_NO_LOOP)
+        return player
+
+    def _prepare_next(self):
+        # Open the next file while the current one plays so EOF only has to switch transmission
+        if self._next_player is not None or not self.deque or self._tearing_down:
+            return
+        filename = self.deque[0].filename
+        try:
+            player = AudioMediaPlayer(self)
+            player.createPlayer(filename, pj.PJMEDIA_FILE_NO_LOOP)
+        except pj.Error as e:
+            logger.debug("Next player prefetch failed. [error=%s, session_id=%s]", getattr(e, "reason", e), self.session_id)
+            return
+        self._next_player = player
+        self._next_filename = filename
 
-    async def on_eof(self):
+    def _drop_next_player(self):
+        self._next_player = None
+        self._next_filename = None
+
+    async def on_eof(self, player: Optional[AudioMediaPlayer] = None):
+        if player is not None and player._epoch != self._epoch:
+            logger.debug("Stale on_eof ignored. [session_id=%s]", self.session_id)
+            return
         ca = self.current_audio
         logger.debug("on_eof. [filename=%s, session_id=%s]", getattr(ca, "filename", None), self.session_id)
         self.destroy_player()
@@ -112,7 +200,6 @@ class SmartPlayer:
         if not self.current_audio:
             return
         if self.current_audio.discard:
-            with suppress(FileNotFoundError):
-                logger.debug("Discarding audio file. [filename=%s, session_id=%s]", self.current_audio.filename, self.session_id)
-                os.remove(self.current_audio.filename)
+            logger.debug("Discarding audio file. [filename=%s, session_id=%s]", self.current_audio.filename, self.session_id)
+        self.current_audio.release()
         self.current_audio = None
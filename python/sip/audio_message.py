@@ -5,6 +5,8 @@ import time
 logger = logging.getLogger(__name__)
 
 class AudioMessage:
+    __slots__ = ("text", "task", "blob")
+
     def __init__(self, call: 'PjCall', text: str):
         self.text = text
         self.task = asyncio.create_task(synthesize(text, call))
@@ -21,7 +23,7 @@ async def synthesize(text: str, call: 'PjCall'):
     response = await call.session_synthesize(text)
     elapsed = time.perf_counter() - start_time
     if call.start_response_generation != 0.0:
-        call.app.client_response_time.observe({"method": "synthesize"}, elapsed)
+        call.app.observe_response_time("synthesize", elapsed)
         logger.info("Synthesize finished. [text=%s, elapsed_sec=%s, session_id=%s]", text, elapsed, call.session_id)
     return response
 
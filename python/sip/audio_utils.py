@@ -0,0 +1,35 @@
+import struct
+from typing import Optional
+
+import numpy as np
+
+# RIFF header of a PCM WAV: RIFF/WAVE, fmt subchunk, data subchunk
+_WAV_HEADER = struct.Struct('<4sI4s4sIHHIIHH4sI')
+_PCM16_MAX = np.float32(32767)
+
+
+def wav_header(data_size: int, framerate: int = 16000, channels: int = 1, sampwidth: int = 2) -> bytes:
+    """Canonical 44-byte PCM WAV header for data_size bytes of samples."""
+    return _WAV_HEADER.pack(b'RIFF', 36 + data_size, b'WAVE', b'fmt ', 16, 1, channels, framerate,
+                            framerate * channels * sampwidth, channels * sampwidth, sampwidth * 8,
+                            b'data', data_size)
+
+
+def to_pcm16(audio: np.ndarray, out: Optional[np.ndarray] = None,
+             scratch: Optional[np.ndarray] = None) -> np.ndarray:
+    """Converts audio to 16-bit little-endian PCM, the single float->int16 conversion of the gateway.
+
+    Float audio is expected in [-1, 1]; it is clipped, scaled by 32767 and truncated. Integer audio is
+    cast as is. out, an int16 buffer of the same length, receives the samples instead of a new array,
+    and scratch, a float32 buffer of the same length, takes the clipped floats, so that with both
+    the conversion allocates nothing.
+    """
+    if audio.dtype.kind != 'f':
+        if out is None:
+            return np.ascontiguousarray(audio, dtype='<i2')
+        np.copyto(out, audio, casting='unsafe')
+        return out
+    if out is None:
+        out = np.empty(audio.shape, dtype='<i2')
+    clipped = np.clip(audio, -1.0, 1.0, out=scratch)
+    return np.multiply(clipped, _PCM16_MAX, out=out, casting='unsafe')
@@ -47,7 +47,7 @@ class PjAccount(pj.Account):
             prm = pj.CallOpParam(True)
             prm.statusCode = pj.PJSIP_SC_RINGING
             call.answer(prm)
-            AsyncCallbackJob(self.on_incoming_call, call).submit()
+            AsyncCallbackJob(self.on_incoming_call, call).submit(self.app.loop)
         except Exception as e:
             logger.error("Exception in onIncomingCall. [error_type=%s, error=%s, call_id=%s]",
                         e.__class__.__name__, str(e), iprm.callId, exc_info=True)
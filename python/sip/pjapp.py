@@ -1,39 +1,95 @@
 import asyncio
+import functools
 import logging
 import os
+import queue
 import signal
-import urllib.request
+import threading
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 
+import aiohttp
 import pjsua2 as pj
 from aiohttp import web
 from aiohttp_swagger import setup_swagger
-from aioprometheus import Registry, Counter, Histogram, Summary, render
+from aioprometheus import Registry, Counter, Histogram, Summary
+from aioprometheus.negotiator import negotiate
 
 from src.backend.client_bot_base import ClientBotBase
+from src.integrations.sip.async_callback import AsyncCallbackQueue
 from src.integrations.sip.pjaccount import PjAccount
 from src.integrations.sip.pjcall import PjCall
 from src.integrations.sip.sip_config import sip_config
 from src.integrations.sip.sip_mixin import SipAppMixin
-from src.integrations.sip.vad.processor6 import VADModel
+from src.integrations.sip.stt_batcher import STTBatcher
+from src.integrations.sip.vad.processor6 import VADBatcher, VADModel, VADWorker
 
 logger = logging.getLogger(__name__)
 
+_PJ_ERROR = pj.Error
+
+MAX_EVENTS_PER_TICK = 64  # events drained before yielding to the loop
+MAX_IDLE_WAIT = 0.1  # sec., absolute ceiling of the idle poll wait
+IDLE_INTERVAL = 1.0  # sec., idle() period when events are pumped on a dedicated thread
+# Highest priority first, so the preferred codecs are configured before the rest
+_CODEC_PRIORITY_ITEMS = tuple(sorted(sip_config.codecs_priority.items(), key=lambda item: item[1], reverse=True))
+METRIC_METHODS = ("synthesize", "play_queue", "transcribe", "generate")
+
+
+METRICS_BUF_SIZE = 64 * 1024
+_METRICS_BUF_POOL: "queue.SimpleQueue[bytearray]" = queue.SimpleQueue()
+_METRICS_BUF_POOL.put(bytearray(METRICS_BUF_SIZE))
+
+
+@functools.lru_cache(maxsize=16)
+def _parse_accepts(accept_header: str) -> Tuple[str, ...]:
+    return tuple(ct.strip() for ct in accept_header.split(",")) if accept_header else ()
+
+
+@functools.lru_cache(maxsize=16)
+def _negotiate(accepts: Tuple[str, ...]):
+    # Scrapers send the same Accept header every time, negotiate the formatter once per header
+    return negotiate(accepts)
+
+
+def _render_into(registry: Registry, accepts: Tuple[str, ...], buf: bytearray) -> Tuple[int, Dict[str, str]]:
+    """Same output as aioprometheus.render(), written into a reusable buffer instead of a joined string.
+
+    Writes go through slice assignment so the buffer keeps its capacity between scrapes; returns the
+    number of bytes written and the response headers.
+    """
+    formatter = _negotiate(accepts)()
+    pos = 0
+    for block in sorted(formatter.marshall_collector(collector) for collector in registry.get_all()):
+        data = block.encode("utf-8")
+        end = pos + len(data)
+        buf[pos:end] = data
+        buf[end:end + 1] = b"\n"
+        pos = end + 1
+    return pos, formatter.get_headers()
+
+
 class PjApp(ClientBotBase, SipAppMixin):
     def __init__(self, base_url: str, *args, **kwargs):
         ClientBotBase.__init__(self, base_url)
         SipAppMixin.__init__(self, *args, **kwargs)
-        self.app.add_routes([
-            web.get('/health', self.health),
-        ])
         self.acc: PjAccount | None = None
         self.ep_cfg: pj.EpConfig | None = None
         self.quiting = False
+        self._quit_event = asyncio.Event()
+        self._pump_stop = threading.Event()
+        self._pump_thread: threading.Thread | None = None
         self.ep: pj.Endpoint | None = None
-        if not Path(sip_config.vad_model_path).is_file():
-            urllib.request.urlretrieve(sip_config.vad_model_url, sip_config.vad_model_path)
-        self.vad_engine = VADModel(model_path=Path(sip_config.vad_model_path), sampling_rate=sip_config.vad_sampling_rate)
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.callback_queue: AsyncCallbackQueue | None = None
+        self.vad_engine: VADModel | None = None
+        self.vad_batcher: VADBatcher | None = None
+        self.vad_worker: VADWorker | None = None
+        # Session for requests outside the backend base URL, e.g. the local STT server
+        self.http_session: aiohttp.ClientSession | None = None
+        self.stt_batcher: STTBatcher | None = None
+        # idle() is awaited from the run loop only when a subclass actually overrides it
+        self._has_idle = type(self).idle is not PjApp.idle
 
         self.prometheus_registry = Registry()
         self.client_request_counter: Counter = Counter(
@@ -48,18 +104,69 @@ class PjApp(ClientBotBase, SipAppMixin):
             "response_time_milliseconds",
             "Response time in milliseconds"
         )
+        self.message_queue_overflow_counter: Counter = Counter(
+            "message_queue_overflow_total",
+            "TTS messages dropped because a call's message queue was full"
+        )
+        self.callback_queue_overflow_counter: Counter = Counter(
+            "callback_queue_overflow_total",
+            "Audio frames dropped because the PJSIP-to-loop callback queue was full"
+        )
         self.prometheus_registry.register(self.client_request_counter)
         self.prometheus_registry.register(self.client_response_time)
         self.prometheus_registry.register(self.client_response_summary)
+        self.prometheus_registry.register(self.message_queue_overflow_counter)
+        self.prometheus_registry.register(self.callback_queue_overflow_counter)
+        # Label dicts are built once per method instead of on every observation
+        self._method_labels: Dict[str, Dict[str, str]] = {method: {"method": method} for method in METRIC_METHODS}
         self.app.add_routes([
+            web.get('/health', self.health),
             web.get('/metrics', self.metrics),
         ])
 
+    def method_labels(self, method: str) -> Dict[str, str]:
+        labels = self._method_labels.get(method)
+        if labels is None:
+            labels = self._method_labels[method] = {"method": method}
+        return labels
+
+    def observe_response_time(self, method: str, elapsed: float, summary: bool = False):
+        labels = self.method_labels(method)
+        self.client_response_time.observe(labels, elapsed)
+        if summary:
+            self.client_response_summary.observe(labels, elapsed)
+
     async def metrics(self, request: web.Request):
-        accept_header = request.headers.get("Accept", "")
-        accepts = [ct.strip() for ct in accept_header.split(",")] if accept_header else []
-        content, http_headers = render(self.prometheus_registry, accepts)
-        return web.Response(body=content, headers=http_headers)
+        accepts = _parse_accepts(request.headers.get("Accept", ""))
+        try:
+            buf = _METRICS_BUF_POOL.get_nowait()
+        except queue.Empty:
+            buf = bytearray(METRICS_BUF_SIZE)
+        try:
+            size, http_headers = _render_into(self.prometheus_registry, accepts, buf)
+            with memoryview(buf) as view:
+                body = bytes(view[:size])
+            return web.Response(body=body, headers=http_headers)
+        finally:
+            _METRICS_BUF_POOL.put(buf)
+
+    async def open(self):
+        await super().open()
+        connector = aiohttp.TCPConnector(limit=100, keepalive_timeout=60)
+        self.http_session = aiohttp.ClientSession(connector=connector)
+        if sip_config.use_local_stt and sip_config.local_stt_batching:
+            self.stt_batcher = STTBatcher(self.http_session, sip_config.local_stt_batch_url, sip_config.local_stt_lang,
+                                          max_batch_size=sip_config.local_stt_batch_max_size,
+                                          max_wait_ms=sip_config.local_stt_batch_wait_ms)
+
+    async def close(self):
+        await super().close()
+        if self.stt_batcher is not None:
+            self.stt_batcher.close()
+            self.stt_batcher = None
+        if self.http_session is not None:
+            await self.http_session.close()
+            self.http_session = None
 
     async def on_startup(self, app):
         logger.info("SIP app startup. [app=%s, base_url=%s]", self.get_app_name(), self.get_base_url())
@@ -70,63 +177,157 @@ class PjApp(ClientBotBase, SipAppMixin):
     async def ws_message(self, session: 'PjCall', message: Dict[str, str]):
         await session.handle_ws_message(message)
 
-    def handle_events(self) -> int:
+    def handle_events(self, timeout_ms: Optional[int] = None) -> int:
+        if timeout_ms is None:
+            timeout_ms = int(sip_config.events_delay * 1000)
         try:
-            return self.ep.libHandleEvents(int(sip_config.events_delay * 1000))
-        except pj.Error as e:
-            logger.error("PJSIP error handling events. [reason=%s, status=%s]", e.reason, e.status)
-            return 0
+            return self.ep.libHandleEvents(timeout_ms)
         except Exception as e:
-            logger.error("Error handling PJSIP events. [error_type=%s, error=%s]", e.__class__.__name__, str(e), exc_info=True)
+            # pj.Error carries reason/status, anything else is unexpected and gets a traceback
+            logger.error("Error handling PJSIP events. [error_type=%s, reason=%s, status=%s]", type(e).__name__,
+                         getattr(e, "reason", str(e)), getattr(e, "status", None), exc_info=not isinstance(e, _PJ_ERROR))
             return 0
 
     async def quit(self):
         logger.info("Quitting SIP app. [app=%s]", self.get_app_name())
         self.quiting = True
+        self._pump_stop.set()
+        self._quit_event.set()
 
     async def run(self):
-        consecutive_empty_cycles = 0
+        if self._pump_thread is None:
+            await self._run_polling()
+        else:
+            await self._run_idle()
+
+    async def _run_polling(self):
+        # Callbacks must run on this thread, so poll without blocking and back off while idle.
+        # Hot lookups are bound to locals once, this loop spins at kHz rates with active calls
+        async_delay = sip_config.async_delay
+        handle = self.ep.libHandleEvents
+        sleep = asyncio.sleep
+        idle = self.idle if self._has_idle else None
+        # Nothing wakes this loop when SIP traffic arrives, so the idle wait is also the worst-case
+        # delay of an INVITE or BYE; it stays at the old two polling periods instead of backing off further
+        max_wait = min(async_delay * 2, MAX_IDLE_WAIT)
+        wait = async_delay
         while not self.quiting:
             try:
-                events_processed = self.handle_events()
-                if events_processed == 0:
-                    consecutive_empty_cycles += 1
-                    if consecutive_empty_cycles > 10:
-                        sleep_time = min(sip_config.async_delay * 2, 0.1)
-                    else:
-                        sleep_time = sip_config.async_delay
+                drained = 0
+                while drained < MAX_EVENTS_PER_TICK and handle(0) > 0:
+                    drained += 1
+                if drained:
+                    wait = async_delay
+                    await sleep(0)
                 else:
-                    consecutive_empty_cycles = 0
-                    sleep_time = 0.001
-                await asyncio.sleep(sleep_time)
-                await self.idle()
+                    await sleep(wait)
+                    wait = min(wait * 2, max_wait)
+                if idle is not None:
+                    await idle()
 
             except Exception as e:
-                logger.error("Error in main loop. [error=%s]", str(e))
-                await asyncio.sleep(0.1)
+                if isinstance(e, _PJ_ERROR):
+                    logger.error("PJSIP error handling events. [reason=%s, status=%s]", e.reason, e.status)
+                else:
+                    logger.error("Error in main loop. [error_type=%s, error=%s]", type(e).__name__, str(e))
+                    await sleep(0.1)
+
+    def _start_event_pump(self):
+        # PJSIP may call back from any thread, so its events are handled on a dedicated native thread
+        self._pump_stop.clear()
+        self._pump_thread = threading.Thread(target=self._pump, name="pjsip-events", daemon=True)
+        self._pump_thread.start()
+
+    def _pump(self):
+        self.ep.libRegisterThread("pjsip-events")
+        stop = self._pump_stop
+        handle_events = self.handle_events
+        timeout_ms = max(1, int(sip_config.events_delay * 1000))
+        while not stop.is_set():
+            handle_events(timeout_ms)
+
+    def _stop_event_pump(self):
+        if self._pump_thread is not None:
+            self._pump_stop.set()
+            self._pump_thread.join()
+            self._pump_thread = None
+
+    async def _run_idle(self):
+        while not self.quiting:
+            if self._has_idle:
+                await self.idle()
+            try:
+                await asyncio.wait_for(self._quit_event.wait(), IDLE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
 
     async def idle(self):
         pass
 
     async def destroy(self):
         # self.executor.shutdown(True, cancel_futures=True)
+        self._stop_event_pump()
         await self.close()
+        if self.vad_batcher is not None:
+            self.vad_batcher.close()
+            self.vad_batcher = None
+        if self.vad_worker is not None:
+            self.vad_worker.close()
+            self.vad_worker = None
         self.acc.shutdown()
         self.acc = None
         self.ep.libDestroy()
         self.ep = None
 
+    @staticmethod
+    def _string_vector(items) -> pj.StringVector:
+        vector = pj.StringVector()
+        for item in items:
+            vector.append(item)
+        return vector
+
+    @staticmethod
+    async def _ensure_vad_model(model_path: Path, url: str, chunk_size: int = 65536):
+        if model_path.is_file():
+            return
+        logger.info("Downloading VAD model. [url=%s, path=%s]", url, model_path)
+        tmp_path = model_path.with_name(model_path.name + ".part")
+        async with aiohttp.ClientSession(raise_for_status=True) as session:
+            async with session.get(url) as resp:
+                with open(tmp_path, "wb") as f:
+                    async for chunk in resp.content.iter_chunked(chunk_size):
+                        f.write(chunk)
+        os.replace(tmp_path, model_path)
+
     async def init(self):
+        self.loop = asyncio.get_running_loop()
+        self.callback_queue = AsyncCallbackQueue(
+            self.loop, max_pending=sip_config.callback_queue_max_pending,
+            on_overflow=lambda dropped: self.callback_queue_overflow_counter.add({}, dropped))
+        model_path = Path(sip_config.vad_model_path)
+        await self._ensure_vad_model(model_path, sip_config.vad_model_url)
+        self.vad_engine = VADModel(model_path=model_path, sampling_rate=sip_config.vad_sampling_rate,
+                                   quantize=sip_config.vad_quantize,
+                                   intra_op_threads=sip_config.vad_intra_op_threads,
+                                   cache_optimized=sip_config.vad_cache_optimized,
+                                   quantized_model_path=Path(sip_config.vad_quantized_model_path)
+                                   if sip_config.vad_quantized_model_path else None,
+                                   silence_floor=sip_config.vad_silence_floor)
+        if sip_config.vad_worker_thread:
+            self.vad_worker = VADWorker(max_pending=sip_config.vad_worker_max_pending)
+            self.vad_worker.start()
+        elif sip_config.vad_batching:
+            self.vad_batcher = VADBatcher(self.vad_engine, max_batch_size=sip_config.vad_batch_max_size,
+                                          max_wait_ms=sip_config.vad_batch_wait_ms)
+
         self.ep = pj.Endpoint()
         self.ep.libCreate()
         self.ep_cfg = pj.EpConfig()
-        self.ep_cfg.uaConfig.threadCnt = 1
-        if sip_config.ua_zero_thread_cnt:
-            self.ep_cfg.uaConfig.threadCnt = 0
+        self.ep_cfg.uaConfig.threadCnt = 0 if sip_config.ua_zero_thread_cnt else max(1, sip_config.ua_thread_cnt)
         self.ep_cfg.uaConfig.mainThreadOnly = sip_config.ua_main_thread_only
         # self.ep_cfg.uaConfig.mainThreadOnly = False
         self.ep_cfg.uaConfig.maxCalls = 32
-        self.ep_cfg.medConfig.threadCnt = 1
+        self.ep_cfg.medConfig.threadCnt = sip_config.sip_media_thread_cnt
         self.ep_cfg.medConfig.hasIoqueue = True
         self.ep_cfg.medConfig.srtpUse = pj.PJMEDIA_SRTP_OPTIONAL
         # self.ep_cfg.medConfig.srtpSecureSignaling = 0
@@ -148,16 +349,17 @@ class PjApp(ClientBotBase, SipAppMixin):
         self.ep_cfg.logConfig.level = sip_config.pjsip_log_level
         self.ep_cfg.logConfig.filename = sip_config.log_filename
         if sip_config.sip_stun_servers:
-            stun_servers = pj.StringVector()
-            for stun_server in sip_config.sip_stun_server:
-                stun_servers.append(stun_server)
-            self.ep_cfg.uaConfig.stunServer = stun_servers
+            self.ep_cfg.uaConfig.stunServer = self._string_vector(sip_config.sip_stun_servers)
         self.ep.libInit(self.ep_cfg)
-        for codec, priority in sip_config.codecs_priority.items():
-            self.ep.codecSetPriority(codec, priority)
+        for codec, priority in _CODEC_PRIORITY_ITEMS:
+            try:
+                self.ep.codecSetPriority(codec, priority)
+            except pj.Error as e:
+                logger.warning("Codec not supported, skipping. [codec_id=%s, reason=%s]", codec, e.reason)
 
-        for codec in self.ep.codecEnum2():
-            logger.info("Supported codec. [codec_id=%s, priority=%s]", codec.codecId, codec.priority)
+        if logger.isEnabledFor(logging.DEBUG):
+            for codec in self.ep.codecEnum2():
+                logger.debug("Supported codec. [codec_id=%s, priority=%s]", codec.codecId, codec.priority)
         if sip_config.sip_null_device:
             self.ep.audDevManager().setNullDev()
         sip_tp_config = pj.TransportConfig()
@@ -180,10 +382,7 @@ class PjApp(ClientBotBase, SipAppMixin):
         cred = pj.AuthCredInfo("digest", "*", sip_config.sip_login, 0, sip_config.sip_password)
         acfg.sipConfig.authCreds.append(cred)
         if sip_config.sip_proxy_servers:
-            proxy_servers = pj.StringVector()
-            for proxy_server in sip_config.sip_proxy_servers:
-                proxy_servers.append(proxy_server)
-            acfg.sipConfig.proxies = proxy_servers
+            acfg.sipConfig.proxies = self._string_vector(sip_config.sip_proxy_servers)
         acfg.natConfig.iceEnabled = sip_config.sip_use_ice
         # acfg.mediaConfig.noVad = config.ec_no_vad
         # acfg.mediaConfig.ecTailLen = config.ec_tail_len
@@ -193,19 +392,19 @@ class PjApp(ClientBotBase, SipAppMixin):
         self.acc = PjAccount(self)
         self.acc.create(acfg)
         await self.open()
+        if not sip_config.ua_main_thread_only:
+            self._start_event_pump()
 
 async def main():
-    from src.integrations.sip.async_callback import set_main_loop
-
-    # Set the main event loop for async callbacks
-    set_main_loop(asyncio.get_event_loop())
-
     backend_url = os.environ["BACKEND_URL"]
     sip_app = PjApp(backend_url)
-    signal.signal(signal.SIGINT, lambda _0, _1: asyncio.create_task(sip_app.quit()))
-    signal.signal(signal.SIGTERM, lambda _0, _1: asyncio.create_task(sip_app.quit()))
-    signal.signal(signal.SIGABRT, lambda _0, _1: asyncio.create_task(sip_app.quit()))
-    signal.signal(signal.SIGQUIT, lambda _0, _1: asyncio.create_task(sip_app.quit()))
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGABRT, signal.SIGQUIT):
+        try:
+            loop.add_signal_handler(sig, lambda: asyncio.create_task(sip_app.quit()))
+        except NotImplementedError:
+            # Windows event loops do not support signal handlers
+            signal.signal(sig, lambda _0, _1: loop.call_soon_threadsafe(asyncio.create_task, sip_app.quit()))
     try:
         await sip_app.init()
         rewrite_root = os.getenv("REWRITE_ROOT", "true").lower() == "true"
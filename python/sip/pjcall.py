@@ -1,20 +1,19 @@
 import asyncio
-import io
 import logging
 import os
+import queue
 import re
-import struct
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from pathlib import Path
-from typing import Optional, Dict, cast
+from typing import Optional, Deque, Dict, Tuple, cast
 from typing import TYPE_CHECKING
 
 import aiohttp
 import numpy as np
 import pjsua2 as pj
-import scipy
-import aiofiles
 from numpy import ndarray
 from pjsua2 import CallInfo
 from scipy.io import wavfile
@@ -22,15 +21,17 @@ from uuid_extensions import uuid7
 
 from src.backend.client_bot_base import ClientBotSession
 from src.integrations.sip.audio_message import AudioMessage
+from src.integrations.sip.audio_utils import to_pcm16, wav_header
 from src.integrations.sip.task_manager import TaskManager, TaskName
 from src.integrations.sip.vad.processor6 import StreamingVADProcessor
 
 if TYPE_CHECKING:
     from src.integrations.sip.pjapp import PjApp
 from src.integrations.sip.async_callback import AsyncCallbackJob
-from src.integrations.sip.audio_media_player import SmartPlayer
+from src.integrations.sip.audio_media_player import MEMORY_FILES_SUPPORTED, SmartPlayer
 from src.integrations.sip.recording_port import RecordingPort
-from src.integrations.sip.sip_config import sip_config
+from src.integrations.sip.sip_config import RECORD_AUDIO_PARTS, SIP_AUDIO_DIR, sip_config
+from src.integrations.sip.stt_batcher import stt_text
 
 logger = logging.getLogger(__name__)
 logging.getLogger("src.integrations.sip.vad.processor").setLevel(logging.INFO)
@@ -39,19 +40,139 @@ logging.getLogger("src.integrations.sip.vad.processor").setLevel(logging.INFO)
 END_OF_CONVERSATION = object()
 END_OF_STREAM = object()
 
+_EMOJI_RE = re.compile("["
+                       u"\U0001F600-\U0001F64F"  # emoticons
+                       u"\U0001F300-\U0001F5FF"  # symbols & pictographs
+                       u"\U0001F680-\U0001F6FF"  # transport & map symbols
+                       u"\U0001F700-\U0001F77F"  # alchemical symbols
+                       u"\U0001F780-\U0001F7FF"  # Geometric Shapes
+                       u"\U0001F800-\U0001F8FF"  # Supplemental Arrows-C
+                       u"\U0001F900-\U0001F9FF"  # Supplemental Symbols and Pictographs
+                       u"\U0001FA00-\U0001FA6F"  # Chess Symbols
+                       u"\U0001FA70-\U0001FAFF"  # Symbols and Pictographs Extended-A
+                       u"\U00002702-\U000027B0"  # Dingbats
+                       u"\U000024C2-\U0001F251"
+                       "]+", flags=re.UNICODE)
+_WS_RE = re.compile(r'\s+')
+
+_PCM16_SCALE = np.float32(1 / 32768)
+# Audio format of LOCAL_STT_RAW_PCM uploads
+_RAW_STT_HEADERS = {
+    "X-Sample-Rate": str(sip_config.vad_sampling_rate),
+    "X-Channels": "1",
+    "X-Lang": sip_config.local_stt_lang,
+}
+
+# Audio part dumps reuse int16 buffers pooled by size, rounded up to whole seconds of 16 kHz audio.
+# Each bucket keeps at most PART_BUF_MAX_FREE spare buffers, and parts longer than
+# PART_BUF_MAX_BUCKETS seconds are not pooled, so one long utterance does not pin its buffer for good
+PART_BUF_BUCKET = 16000
+PART_BUF_MAX_FREE = 4
+PART_BUF_MAX_BUCKETS = 30
+_PART_BUF_POOLS: Dict[int, "queue.Queue[np.ndarray]"] = {}
+# Dumps of all calls are written one at a time on their own thread, so a large part never holds up
+# the default executor that the TTS temp files go through
+_PART_WRITER: Optional[ThreadPoolExecutor] = \
+    ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio-parts") if RECORD_AUDIO_PARTS else None
+
+# "Display Name" <sip:user@domain;params> -> name, addr
+_NAME_ADDR_RE = re.compile(r'(?P<name>[^<]*)<(?P<addr>[^>]*)>')
+# [sip:|sips:][user@]domain[;params]
+_ADDR_RE = re.compile(r'(?:sips?:)?(?:(?P<user>[^@;]*)@)?(?P<domain>[^;]*)(?:;(?P<params>.*))?', re.IGNORECASE | re.DOTALL)
+
+# Session close status reported to the backend for the last SIP status code of a disconnected call
+_DISCONNECT_STATUS = {
+    pj.PJSIP_SC_DECLINE: "declined",
+    pj.PJSIP_SC_BUSY_HERE: "busy",
+    pj.PJSIP_SC_REQUEST_TERMINATED: "canceled",
+    pj.PJSIP_SC_TEMPORARILY_UNAVAILABLE: "noanswer",
+    pj.PJSIP_SC_REQUEST_TIMEOUT: "noanswer",
+    pj.PJSIP_SC_NOT_FOUND: "not_found",
+    pj.PJSIP_SC_SERVICE_UNAVAILABLE: "network_error",
+    pj.PJSIP_SC_SERVER_TIMEOUT: "network_error",
+    pj.PJSIP_SC_OK: "completed",
+}
+
+
+def _normalize_speech(text: str) -> str:
+    return _WS_RE.sub(' ', text.lower()).strip()
+
+
+def _wav_bytes(pcm: np.ndarray) -> bytearray:
+    """WAV file for 16-bit PCM, assembled with a single copy of the samples."""
+    header = wav_header(pcm.nbytes)
+    wav = bytearray(len(header) + pcm.nbytes)
+    wav[:len(header)] = header
+    wav[len(header):] = memoryview(pcm).cast('B')
+    return wav
+
+
+def _take_part_buffer(n: int) -> np.ndarray:
+    """int16 buffer of at least n samples from the pool of the next 1 s size bucket."""
+    bucket = -(-n // PART_BUF_BUCKET)
+    pool = _PART_BUF_POOLS.get(bucket)
+    if pool is not None:
+        try:
+            return pool.get_nowait()
+        except queue.Empty:
+            pass
+    return np.empty(bucket * PART_BUF_BUCKET, dtype=np.int16)
+
+
+def _give_part_buffer(buf: np.ndarray):
+    bucket = len(buf) // PART_BUF_BUCKET
+    if bucket > PART_BUF_MAX_BUCKETS:
+        return
+    pool = _PART_BUF_POOLS.get(bucket)
+    if pool is None:
+        pool = _PART_BUF_POOLS.setdefault(bucket, queue.Queue(PART_BUF_MAX_FREE))
+    try:
+        pool.put_nowait(buf)
+    except queue.Full:
+        pass
+
+
+def _write_audio_part(wav_dir: str, wav_name: str, buf: np.ndarray, n: int, session_id: str):
+    try:
+        os.makedirs(wav_dir, exist_ok=True)
+        wavfile.write(wav_name, 16000, buf[:n])
+    except Exception as e:
+        logger.error("Unable to write audio part. [path=%s, error=%s, session_id=%s]", wav_name, e, session_id)
+    finally:
+        _give_part_buffer(buf)
+
+
+def _write_file(filename: str, data: bytes):
+    Path(filename).parent.mkdir(parents=True, exist_ok=True)
+    with open(filename, 'wb') as f:
+        f.write(data)
+
 
 class AudioMediaPort(pj.AudioMediaPort):
     def __init__(self, call):
         pj.AudioMediaPort.__init__(self)
         self.call: PjCall = call
+        # Frame dispatch is fixed for the lifetime of the app, so it is resolved once per port
+        self._vad_worker = call.app.vad_worker
+        self._submit = call.app.callback_queue.submit_frame
+        self._process = call.process if call.app.vad_batcher is not None else call.process_frame
 
     def onFrameRequested(self, frame):
         frame.type = pj.PJMEDIA_FRAME_TYPE_AUDIO
 
     def onFrameReceived(self, frame):
+        # frame.buf is a SWIG ByteVector without the buffer protocol and only valid during the callback,
+        # so it is copied exactly once here; process() decodes it with np.frombuffer without another copy
+        if not frame.size:
+            return
         byte_data = bytes(frame.buf)
         if byte_data:
-            AsyncCallbackJob(self.call.process, byte_data).submit()
+            if self._vad_worker is not None:
+                # Straight to the VAD thread, the asyncio loop is not involved per frame
+                self._vad_worker.submit(self.call.process_in_worker, byte_data)
+            else:
+                # Frames of all calls share loop wakeups; unbatched VAD runs as a plain callback, no task per frame
+                self._submit(self._process, byte_data)
 
 
 class CallState(Enum):
@@ -77,15 +198,20 @@ class PjCall(pj.Call, ClientBotSession):
         self.aud_med: pj.AudioMedia | None = None
         self.smart_player: SmartPlayer | None = None
         self.app: PjApp = app
+        self.loop: asyncio.AbstractEventLoop = app.loop
         self.wav_recorder: RecordingPort | None = None
 
         self.processor = self._create_processor()
+        # Read on every frame, so the setting is snapshotted once per call
+        self._allow_interruptions: bool = sip_config.interruptions_are_allowed
+        self._float_scratch = np.empty(sip_config.vad_sampling_rate * sip_config.frame_time_usec // 1_000_000,
+                                       dtype=np.float32)
         
         self.state = CallState.WAIT_FOR_USER
         self.start_time = time.perf_counter()
         self.start_response_generation: float = 0.0
         self.start_reply_generation: float = 0.0
-        self.message_queue: asyncio.Queue[AudioMessage] = asyncio.Queue()
+        self.message_queue: Deque[AudioMessage] = deque()
         self.is_playing = False
         self.unstable_speech_result: Optional[str] = None
         self.tasks: TaskManager = TaskManager()
@@ -94,6 +220,8 @@ class PjCall(pj.Call, ClientBotSession):
         self.xfer_started = False
         self._media_refs = []
         self.status: Optional[str] = None  # session close status
+        self._audio_parts_dir: Optional[str] = None  # RECORD_AUDIO_PARTS directory, resolved on first use
+        self._audio_part_prefix = ""
 
     @staticmethod
     def parse_sip_uri(uri):
@@ -103,31 +231,29 @@ class PjCall(pj.Call, ClientBotSession):
             return result
 
         # Extract display name if present
-        if "<" in uri and ">" in uri:
-            result["name"] = uri.split("<")[0].strip().strip('"')
-            uri = uri[uri.find("<") + 1:uri.find(">")]
-            result["uri"] = uri
-
-        # Remove sip: prefix
-        if uri.lower().startswith(("sip:", "sips:")):
-            uri = uri[uri.find(":") + 1:]
-
-        # Extract params
-        if ";" in uri:
-            uri_part, params_part = uri.split(";", 1)
-            result["params"] = {p.split("=")[0]: p.split("=")[1] if "=" in p else True for p in params_part.split(";")}
-        else:
-            uri_part = uri
-
-        # Extract user and domain
-        if "@" in uri_part:
-            result["user"], result["domain"] = uri_part.split("@", 1)
-        else:
-            result["domain"] = uri_part
+        m = _NAME_ADDR_RE.match(uri)
+        if m:
+            result["name"] = m["name"].strip().strip('"')
+            uri = result["uri"] = m["addr"]
+
+        m = _ADDR_RE.match(uri)
+        result["user"] = m["user"] or ""
+        result["domain"] = m["domain"]
+        if m["params"] is not None:
+            result["params"] = {k: v if sep else True
+                                for k, sep, v in (p.partition("=") for p in m["params"].split(";"))}
 
         return result
 
+    def _on_loop(self, cb):
+        """Callbacks fired on the VAD worker thread run their body on the asyncio loop."""
+        submit = self.app.callback_queue.submit
+        def dispatch(*args):
+            submit(cb, *args)
+        return dispatch
+
     def _create_processor(self) -> StreamingVADProcessor:
+        wrap = self._on_loop if self.app.vad_worker is not None else (lambda cb: cb)
         processor = StreamingVADProcessor(
             vad_engine=self.app.vad_engine,
             threshold = sip_config.vad_threshold,
@@ -138,19 +264,19 @@ class PjCall(pj.Call, ClientBotSession):
             long_pause_ms = sip_config.long_pause_offset_ms,
             user_silence_duration_ms = sip_config.user_silence_timeout_ms,
             speech_prob_window = sip_config.vad_speech_prob_window,
-            on_speech_start = self._on_user_speech_start,
-            on_speech_end = self._on_user_speech_stop,
-            on_short_pause = self._on_short_pause,
-            on_long_pause = self._on_long_pause,
-            on_user_salience_timeout = self._on_user_salience_timeout,
+            on_speech_start = wrap(self._on_user_speech_start),
+            on_speech_end = wrap(self._on_user_speech_stop),
+            on_short_pause = wrap(self._on_short_pause),
+            on_long_pause = wrap(self._on_long_pause),
+            on_user_salience_timeout = wrap(self._on_user_salience_timeout),
+            batcher = self.app.vad_batcher,
         )
         return processor
     
     def unstable_speech_result_is_the_same(self, unstable_speech_result) -> bool:
         if self.unstable_speech_result is None:
             return False
-        normalize = lambda s: re.sub(r'\s+', ' ', s.lower()).strip()
-        return normalize(self.unstable_speech_result) == normalize(unstable_speech_result)
+        return _normalize_speech(self.unstable_speech_result) == _normalize_speech(unstable_speech_result)
 
     def send_bye_with_tag(self, tag: str):
         prm = pj.CallOpParam()
@@ -171,20 +297,10 @@ class PjCall(pj.Call, ClientBotSession):
             logger.debug("onCallState. [call_id=%s, uri=%s, state=%s, state_text=%s, session_id=%s]",
                          ci.callIdString, ci.remoteUri, ci.state, ci.stateText, self.session_id)
             if ci.state == pj.PJSIP_INV_STATE_DISCONNECTED:
-                status = self.status if self.status else \
-                    "declined" if ci.lastStatusCode == pj.PJSIP_SC_DECLINE else \
-                    "busy" if ci.lastStatusCode == pj.PJSIP_SC_BUSY_HERE else \
-                    "canceled" if ci.lastStatusCode == pj.PJSIP_SC_REQUEST_TERMINATED else \
-                    "noanswer" if ci.lastStatusCode in (
-                        pj.PJSIP_SC_TEMPORARILY_UNAVAILABLE, pj.PJSIP_SC_REQUEST_TIMEOUT) else \
-                    "not_found" if ci.lastStatusCode == pj.PJSIP_SC_NOT_FOUND else \
-                    "network_error" if ci.lastStatusCode in (
-                                pj.PJSIP_SC_SERVICE_UNAVAILABLE, pj.PJSIP_SC_SERVER_TIMEOUT) else \
-                    "completed" if ci.lastStatusCode == pj.PJSIP_SC_OK else \
-                    "unknown"
+                status = self.status or _DISCONNECT_STATUS.get(ci.lastStatusCode, "unknown")
                 logger.debug("Call disconnected. [status=%s, last_status_code=%s, last_reason=%s, session_id=%s]", status, ci.lastStatusCode, ci.lastReason, self.session_id)
                 self.close_call()
-                AsyncCallbackJob(self.close_session, status).submit()
+                AsyncCallbackJob(self.close_session, status).submit(self.loop)
             elif ci.state == pj.PJSIP_INV_STATE_CONFIRMED:
                 self.open_call()
                 codec_name = self.getStreamInfo(0).codecName
@@ -193,7 +309,7 @@ class PjCall(pj.Call, ClientBotSession):
                     codec_name, fmt.clockRate, fmt.channelCount, fmt.bitsPerSample, fmt.frameTimeUsec, self.session_id)
                 greeting_message = self.metadata.get('greeting_message')
                 if greeting_message:
-                    AsyncCallbackJob(self.play_voice_response, greeting_message, sip_config.greeting_delay_sec).submit()
+                    AsyncCallbackJob(self.play_voice_response, greeting_message, sip_config.greeting_delay_sec).submit(self.loop)
         except Exception as e:
             logger.error("Exception in onCallState. [error_type=%s, error=%s, session_id=%s]",
                         e.__class__.__name__, str(e), self.session_id, exc_info=True)
@@ -206,7 +322,7 @@ class PjCall(pj.Call, ClientBotSession):
         self.med_port = self.create_input_port()
         self.aud_med.startTransmit(self.med_port)
         self.wav_recorder = self.create_recorder()
-        self.smart_player = SmartPlayer(self.aud_med, self.wav_recorder, self.on_stop_play, session_id=self.session_id)
+        self.smart_player = SmartPlayer(self.aud_med, self.wav_recorder, self.loop, self.on_stop_play, session_id=self.session_id)
         self.aud_med.startTransmit(self.wav_recorder)
         self._media_refs = [self.aud_med, self.med_port, self.wav_recorder, self.smart_player]
 
@@ -243,9 +359,9 @@ class PjCall(pj.Call, ClientBotSession):
         wav_name = self.session_id
         # wav_name = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")[:-3]
         filename = f"{wav_dir / wav_name}.wav"
-        wav_recorder = RecordingPort()
+        wav_recorder = RecordingPort(self.loop)
         # wav_recorder = pj.AudioMediaRecorder()
-        wav_recorder.create_recorder(filename)
+        wav_recorder.create_recorder(filename, sip_config.recording_preallocate_sec, sip_config.recording_fsync)
         return wav_recorder
 
     async def on_stop_play(self):
@@ -267,73 +383,84 @@ class PjCall(pj.Call, ClientBotSession):
         return port
 
     async def play_voice_response(self, message: AudioMessage, delay=0):
+        audio = await self._prepare_voice_response(message)
+        if audio is None:
+            return
+        if delay:
+            await asyncio.sleep(delay)
+        self._submit_voice_response(*audio)
+
+    async def _prepare_voice_response(self, message: AudioMessage) -> Optional[Tuple[bytes, Optional[str]]]:
+        """Wait for the TTS blob and, unless it can be played from memory, write it to a temp file."""
         blob = await message.get_blob()
         if self.start_response_generation != 0.0:
             elapsed = time.perf_counter() - self.start_response_generation
-            self.app.client_response_time.observe({"method": "play_queue"}, elapsed)
-            self.app.client_response_summary.observe({"method": "play_queue"}, elapsed)
+            self.app.observe_response_time("play_queue", elapsed, summary=True)
             logger.debug("Response ready. [elapsed_sec=%s, session_id=%s]", elapsed, self.session_id)
             self.start_response_generation = 0.0
-        filename = f"{sip_config.tmp_audio_dir}/tts-{uuid7()}.wav"
-        Path(filename).parent.mkdir(parents=True, exist_ok=True)
-        async with aiofiles.open(filename, 'wb') as f:
-            await f.write(blob)
         if len(blob) < 364:
             logger.info("Audio too short. [blob_len=%s, session_id=%s]", len(blob), self.session_id)
-            return
-        if delay:
-            await asyncio.sleep(delay)
+            return None
+        filename = None
+        if not MEMORY_FILES_SUPPORTED or sip_config.keep_tts_wav:
+            filename = f"{sip_config.tmp_audio_dir}/tts-{uuid7()}.wav"
+            # One executor hop for the whole write instead of one per aiofiles open/write/close
+            await self.loop.run_in_executor(None, _write_file, filename, blob)
+        return blob, filename
+
+    def _submit_voice_response(self, blob: bytes, filename: Optional[str]):
         if self.smart_player:
-            self.smart_player.put_to_queue(filename, True)
+            if filename is None:
+                self.smart_player.put_bytes_to_queue(blob)
+            else:
+                self.smart_player.put_to_queue(filename, not sip_config.keep_tts_wav)
             self.smart_player.play()
             self.processor.reset_user_salience() # ???
             logger.debug("WAV blob sent to player. [blob_len=%s, session_id=%s]", len(blob), self.session_id)
 
     @staticmethod
     def remove_emojis(text):
-        emoji_pattern = re.compile("["
-                                   u"\U0001F600-\U0001F64F"  # emoticons
-                                   u"\U0001F300-\U0001F5FF"  # symbols & pictographs
-                                   u"\U0001F680-\U0001F6FF"  # transport & map symbols
-                                   u"\U0001F700-\U0001F77F"  # alchemical symbols
-                                   u"\U0001F780-\U0001F7FF"  # Geometric Shapes
-                                   u"\U0001F800-\U0001F8FF"  # Supplemental Arrows-C
-                                   u"\U0001F900-\U0001F9FF"  # Supplemental Symbols and Pictographs
-                                   u"\U0001FA00-\U0001FA6F"  # Chess Symbols
-                                   u"\U0001FA70-\U0001FAFF"  # Symbols and Pictographs Extended-A
-                                   u"\U00002702-\U000027B0"  # Dingbats
-                                   u"\U000024C2-\U0001F251"
-                                   "]+", flags=re.UNICODE)
-        return emoji_pattern.sub(r'', text)
+        return _EMOJI_RE.sub('', text)
 
     @staticmethod
-    def _convert_to_np_float32(data):
-        int16_data = [
-            struct.unpack("<h", bytes(data[i: i + 2]))[0]
-            for i in range(0, len(data), 2)
-        ]
-        audio_float32 = np.array(int16_data, np.float32)
-        audio_float32 *= 1 / 32768
+    def _convert_to_np_float32(data, out: Optional[np.ndarray] = None):
+        # Frames are 16-bit little-endian PCM; the ufunc casts and scales in one pass without an int->float temporary
+        int16_data = np.frombuffer(data, dtype='<i2')
+        if out is None or len(out) < len(int16_data):
+            out = np.empty(len(int16_data), dtype=np.float32)
+        audio_float32 = out[:len(int16_data)]
+        np.multiply(int16_data, _PCM16_SCALE, out=audio_float32)
         return audio_float32
 
-    @staticmethod
-    async def local_transcribe(audio: ndarray) -> dict:
+    def _scratch_float32(self, data) -> np.ndarray:
+        """Converts a frame into the per-call scratch buffer, growing it once if a longer frame arrives."""
+        float32_data = self._convert_to_np_float32(data, self._float_scratch)
+        if len(float32_data) > len(self._float_scratch):
+            self._float_scratch = float32_data
+        return float32_data
+
+    async def local_transcribe(self, audio: ndarray) -> dict:
         if audio.size == 0:
             return {}
-        async with aiohttp.ClientSession() as session:
-            audio_bytes = io.BytesIO()
-            audio_bytes.name = "audio.wav"
-            scipy.io.wavfile.write(audio_bytes, 16000, audio)
-            form_data = aiohttp.FormData()
-            form_data.add_field('file', audio_bytes, filename='file.wav', content_type='audio/wav')
-            form_data.add_field('lang', sip_config.local_stt_lang, content_type='text/plain')
-            async with session.post(sip_config.local_stt_url, data=form_data) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data if isinstance(data, str) else '' if not isinstance(data, dict) else data.get("text")
-                else:
-                    raise Exception(f"Unable to post audio to server. Status code: {response.status},"
-                                    f" audio.size: {audio.size}")
+        pcm = to_pcm16(audio)
+        if sip_config.local_stt_raw_pcm:
+            body = aiohttp.BytesPayload(memoryview(pcm).cast('B'), content_type='application/octet-stream')
+            headers = _RAW_STT_HEADERS
+        else:
+            wav = _wav_bytes(pcm)
+            if self.app.stt_batcher is not None:
+                return await self.app.stt_batcher.submit(wav)
+            body = aiohttp.FormData()
+            body.add_field('file', wav, filename='file.wav', content_type='audio/wav')
+            body.add_field('lang', sip_config.local_stt_lang, content_type='text/plain')
+            headers = None
+        # The app-wide session keeps connections to the STT server alive between requests
+        async with self.app.http_session.post(sip_config.local_stt_url, data=body, headers=headers) as response:
+            if response.status == 200:
+                return stt_text(await response.json())
+            else:
+                raise Exception(f"Unable to post audio to server. Status code: {response.status},"
+                                f" audio.size: {audio.size}")
 
     async def _transcribe(self, audio: ndarray) -> dict:
         logger.debug("Transcribing audio. [time_sec=%.6f, duration_sec=%.2f, session_id=%s]",
@@ -360,7 +487,7 @@ class PjCall(pj.Call, ClientBotSession):
         start_time = time.perf_counter()
         unstable_speech_result = await self._transcribe(buf)
         elapsed = time.perf_counter() - start_time
-        self.app.client_response_time.observe({"method": "transcribe"}, elapsed)
+        self.app.observe_response_time("transcribe", elapsed)
         logger.info("Transcription completed. [text=%s, elapsed_sec=%s, session_id=%s]", unstable_speech_result, elapsed, self.session_id)
 
         if self.state != CallState.SPECULATIVE_GENERATE:
@@ -386,7 +513,7 @@ class PjCall(pj.Call, ClientBotSession):
         await self._start_generate(unstable_speech_result)
 
     def is_active_ai_speech(self):
-        return self.is_playing or self.is_player_active() or (not self.message_queue.empty() and self.ai_can_speak())
+        return self.is_playing or self.is_player_active() or (bool(self.message_queue) and self.ai_can_speak())
 
     def ai_can_speak(self):
         return self.state in (CallState.WAIT_FOR_USER, CallState.COMMIT_GENERATE, CallState.FINISHED,)
@@ -448,7 +575,7 @@ class PjCall(pj.Call, ClientBotSession):
                 logger.debug("Generation response received. [time_sec=%.6f, response=%s, session_id=%s]",
                              self.get_current_time(), response, self.session_id)
                 if not self.is_streaming:
-                    self.message_queue.put_nowait(AudioMessage(self, response))
+                    self.enqueue_message(response)
                 self.set_state(CallState.WAIT_FOR_USER)
                 await self.play_message_queue()
                 if result.get("metadata", {}).get("SESSION_ENDS"):
@@ -466,19 +593,43 @@ class PjCall(pj.Call, ClientBotSession):
                 self.unstable_speech_result = None
                 _ = self.tasks.pop(TaskName.COMMIT, None)
 
+    def enqueue_message(self, text: str):
+        # Bounded so a runaway response stream cannot pile up TTS requests; the oldest pending one is dropped
+        if len(self.message_queue) >= sip_config.max_queued_messages:
+            dropped = self.message_queue.popleft()
+            dropped.task.cancel()
+            self.app.message_queue_overflow_counter.inc({})
+            logger.warning("Message queue overflow, dropping oldest message. [max_queued_messages=%s, session_id=%s]",
+                           sip_config.max_queued_messages, self.session_id)
+        self.message_queue.append(AudioMessage(self, text))
+
     async def play_message_queue(self, and_text: str = None):
         if and_text:
-            self.message_queue.put_nowait(AudioMessage(self, and_text))
+            self.enqueue_message(and_text)
         if not self.is_playing:
             self.is_playing = True
             try:
                 if self.smart_player:
-                    while not self.message_queue.empty():
-                        message = self.message_queue.get_nowait()
-                        await self.play_voice_response(message)
+                    await self._play_queued_messages()
             finally:
                 self.is_playing = False
 
+    async def _play_queued_messages(self):
+        # The next message is prepared (blob wait, file write) while the current one is finished,
+        # messages still reach the player in queue order
+        prepare = self._prepare_voice_response
+        next_task: Optional[asyncio.Task] = None
+        try:
+            while next_task is not None or self.message_queue:
+                task = next_task or asyncio.create_task(prepare(self.message_queue.popleft()))
+                next_task = asyncio.create_task(prepare(self.message_queue.popleft())) if self.message_queue else None
+                audio = await task
+                if audio is not None:
+                    self._submit_voice_response(*audio)
+        finally:
+            if next_task is not None and not next_task.done():
+                next_task.cancel()
+
     def get_current_time(self):
         current_time = time.perf_counter() - self.start_time
         return current_time
@@ -487,7 +638,7 @@ class PjCall(pj.Call, ClientBotSession):
         if message["type"] == "message":
             if self.start_reply_generation != 0.0:
                 elapsed = time.perf_counter() - self.start_reply_generation
-                self.app.client_response_time.observe({"method": "generate"}, elapsed)
+                self.app.observe_response_time("generate", elapsed)
                 logger.info("Generation completed. [elapsed_sec=%s, session_id=%s]", elapsed, self.session_id)
             self.start_reply_generation = 0.0
             text = self.remove_emojis(message["message"])
@@ -504,12 +655,12 @@ class PjCall(pj.Call, ClientBotSession):
             elif self.state in (CallState.SPECULATIVE_GENERATE,):
                 logger.debug("Save to queue (SPECULATIVE_GENERATE). [time_sec=%.6f, session_id=%s]",
                              self.get_current_time(), self.session_id)
-                self.message_queue.put_nowait(AudioMessage(self, text))
+                self.enqueue_message(text)
             else:
                 if self.start_user_speech == 0:
                     logger.debug("Save to queue. [time_sec=%.6f, session_id=%s]",
                                  self.get_current_time(), self.session_id)
-                    self.message_queue.put_nowait(AudioMessage(self, text))
+                    self.enqueue_message(text)
                 else:
                     logger.debug("Discarded message, user speaking. [time_sec=%.6f, session_id=%s]",
                                  self.get_current_time(), self.session_id)
@@ -578,16 +729,40 @@ class PjCall(pj.Call, ClientBotSession):
 
     def clear_message_queue(self):
         if not self.is_playing:
-            while not self.message_queue.empty():
-                self.message_queue.get_nowait().task.cancel()
+            while self.message_queue:
+                self.message_queue.popleft().task.cancel()
 
-    async def process(self, data: bytearray):
+    def _accepts_frame(self, data) -> bool:
         if not data or self.state == CallState.FINISHED:
+            return False
+        return self._allow_interruptions or not (self.is_active_ai_speech() or TaskName.COMMIT in self.tasks)
+
+    def process_frame(self, data: bytes):
+        """process() for frames dispatched to the loop through the callback queue when VAD is not batched."""
+        if not self._accepts_frame(data):
             return
-        if not sip_config.interruptions_are_allowed and (self.is_active_ai_speech() or TaskName.COMMIT in self.tasks):
+        try:
+            self.processor.process_audio(self._scratch_float32(data))
+        except Exception as e:
+            logger.error("Frame processing failed. [error=%s, session_id=%s]", e, self.session_id, exc_info=e)
+
+    async def process(self, data: bytearray):
+        if not self._accepts_frame(data):
             return
-        float32_data = self._convert_to_np_float32(data)
-        self.processor.process_audio(float32_data)
+        if self.processor.batcher is not None:
+            # Frames may wait for the batch lock, so each one needs its own array
+            await self.processor.process_audio_batched(self._convert_to_np_float32(data))
+        else:
+            # Consumed synchronously, so the per-call scratch buffer is reused for every frame
+            self.processor.process_audio(self._scratch_float32(data))
+
+    def process_in_worker(self, data: bytes):
+        """process() for the VAD worker thread; detection callbacks are dispatched back to the loop."""
+        if not self._accepts_frame(data):
+            return
+        float32_data = self._scratch_float32(data)
+        with self.processor.lock:
+            self.processor.process_audio(float32_data)
 
     def _on_short_pause(self, speech_buffer: np.ndarray, start: float, duration: float):
         """Callback for short pause detection - used for speculation"""
@@ -595,39 +770,47 @@ class PjCall(pj.Call, ClientBotSession):
         if speech_buffer is None or len(speech_buffer) == 0:
             return
 
-        logger.debug("Short pause detected. [time_sec=%.6f, start_sec=%.2f, duration_sec=%.2f, buffer_len=%s, session_id=%s]",
-                     self.get_current_time(), start, duration, len(speech_buffer), self.session_id)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Short pause detected. [time_sec=%.6f, start_sec=%.2f, duration_sec=%.2f, buffer_len=%s, session_id=%s]",
+                         self.get_current_time(), start, duration, len(speech_buffer), self.session_id)
 
         # Check if there's already a COMMIT task running - if so, skip speculation
         if TaskName.COMMIT in self.tasks:
-            logger.debug("Skipping speculation due to active commit task. [time_sec=%.6f, session_id=%s]",
-                         self.get_current_time(), self.session_id)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Skipping speculation due to active commit task. [time_sec=%.6f, session_id=%s]",
+                             self.get_current_time(), self.session_id)
             return
 
         if duration < 2.5:  # Skip speculation on short utterances
-            logger.debug("Speech too short, waiting for long pause. [time_sec=%.6f, duration_sec=%.2f, session_id=%s]",
-                         self.get_current_time(), duration, self.session_id)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Speech too short, waiting for long pause. [time_sec=%.6f, duration_sec=%.2f, session_id=%s]",
+                             self.get_current_time(), duration, self.session_id)
             return
 
         # Clear message queue and start new speculation (with rollback if needed)
         self.clear_message_queue()
         self.start_response_generation = time.perf_counter()
-        AsyncCallbackJob(self._rollback_and_speculative_generate, speech_buffer).submit()
+        AsyncCallbackJob(self._rollback_and_speculative_generate, speech_buffer).spawn()
 
     def _on_long_pause(self,  speech_buffer: np.ndarray, start: float, duration: float):
         """Callback for long pause detection - used for commit"""
         if speech_buffer is None or len(speech_buffer) == 0:
             return
 
-        logger.debug("Long pause detected. [time_sec=%.6f, start_sec=%.2f, duration_sec=%.2f, buffer_len=%s, session_id=%s]",
-                     self.get_current_time(), start, duration, len(speech_buffer), self.session_id)
-
-        if sip_config.record_audio_parts:
-            wav_dir = Path(sip_config.sip_audio_dir, self.session_id)
-            wav_dir.mkdir(parents=True, exist_ok=True)
-            wav_name = wav_dir/f"part-{uuid7()}.wav"
-            audio_int16 = (speech_buffer * 32767).astype(np.int16)
-            wavfile.write(str(wav_name), 16000, audio_int16)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Long pause detected. [time_sec=%.6f, start_sec=%.2f, duration_sec=%.2f, buffer_len=%s, session_id=%s]",
+                         self.get_current_time(), start, duration, len(speech_buffer), self.session_id)
+
+        if RECORD_AUDIO_PARTS:
+            wav_dir = self._audio_parts_dir
+            if wav_dir is None:
+                wav_dir = self._audio_parts_dir = os.path.join(SIP_AUDIO_DIR, self.session_id)
+                self._audio_part_prefix = f"{wav_dir}/part-"
+            wav_name = f"{self._audio_part_prefix}{uuid7()}.wav"
+            buf = _take_part_buffer(len(speech_buffer))
+            to_pcm16(speech_buffer, out=buf[:len(speech_buffer)])
+            # mkdir and the write run on the audio parts thread, the callback returns immediately
+            self.loop.run_in_executor(_PART_WRITER, _write_audio_part, wav_dir, wav_name, buf, len(speech_buffer), self.session_id)
 
         # Start commit generation
         self.tasks.create_task(TaskName.COMMIT, self._commit_generate(speech_buffer))
@@ -652,8 +835,9 @@ class PjCall(pj.Call, ClientBotSession):
     def _on_user_speech_start(self, silence_pad_buffer: np.ndarray, start: float, duration: float):
         """Handle the start of user speech"""
         current_time = self.get_current_time()
-        logger.debug("User speech started. [time_sec=%.6f, speech_start_sec=%.2f, session_id=%s]",
-                     current_time, start + duration, self.session_id)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("User speech started. [time_sec=%.6f, speech_start_sec=%.2f, session_id=%s]",
+                         current_time, start + duration, self.session_id)
         self.start_user_speech = current_time
         # Cancel user salience timeout when user speaks
         self.processor.cancel_user_salience()
@@ -662,25 +846,27 @@ class PjCall(pj.Call, ClientBotSession):
             self.smart_player.interrupt()
         self.clear_message_queue()
         # Gracefully rollback speculative generation instead of just cancelling
-        AsyncCallbackJob(self._rollback_start_task).submit()
+        AsyncCallbackJob(self._rollback_start_task).spawn()
 
     def _on_user_speech_stop(self, speech_buffer: np.ndarray, start: float, duration: float):
         """Handle the end of user speech (before pause detection)"""
-        current_time = self.get_current_time()
-        logger.debug("User speech ended. [time_sec=%.6f, speech_end_sec=%.2f, duration_sec=%.2f, session_id=%s]",
-                     current_time, start + duration, duration, self.session_id)
+        if logger.isEnabledFor(logging.DEBUG):
+            current_time = self.get_current_time()
+            logger.debug("User speech ended. [time_sec=%.6f, speech_end_sec=%.2f, duration_sec=%.2f, session_id=%s]",
+                         current_time, start + duration, duration, self.session_id)
 
     def _on_user_salience_timeout(self, current_time: float):
         """Handle user salience timeout (user not speaking after bot finishes)"""
-        logger.debug("User salience timeout, finishing. [time_sec=%.6f, timeout_sec=%.2f, session_id=%s]",
-                     self.get_current_time(), current_time, self.session_id)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("User salience timeout, finishing. [time_sec=%.6f, timeout_sec=%.2f, session_id=%s]",
+                         self.get_current_time(), current_time, self.session_id)
 
         # Set the call state to finished
         self.set_state(CallState.FINISHED)
 
         # Initiate a soft hangup
         # self.status = "user_timeout"  # commented until backend supports this status
-        AsyncCallbackJob(self.hangup_if_no_active_speech).submit()
+        AsyncCallbackJob(self.hangup_if_no_active_speech).spawn()
 
     async def close_session(self, status: Optional[str]=None):
         try:
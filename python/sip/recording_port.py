@@ -1,16 +1,33 @@
+import asyncio
 import logging
+import threading
 
 import pjsua2 as pj
 
 from src.integrations.sip.async_callback import AsyncCallbackJob
-from src.integrations.sip.wav_writer import AsyncWavWriter
+from src.integrations.sip.wav_writer import AsyncWavWriter, FramePool
 
 logger = logging.getLogger(__name__)
 
+RECORDING_BATCH_FRAMES = 8  # frames buffered per drain, 480 ms at 60 ms frames
+RECORDING_FRAME_BYTES = 1920  # 60 ms of 16 kHz mono PCM16
+
 class RecordingPort(pj.AudioMediaPort):
-    def __init__(self):
+    def __init__(self, loop: asyncio.AbstractEventLoop):
         super().__init__()
+        self.loop = loop
         self.wav_file = None
+        # Frames received from the media thread accumulate here and are drained every
+        # RECORDING_BATCH_FRAMES frames; the tail is flushed on close.
+        # A single drain task per port owns the file, so open/write/close stay in order
+        self._lock = threading.Lock()
+        # Batches are filled in place in pooled buffers; the writer hands each one back once copied
+        self._frame_pool = FramePool(RECORDING_BATCH_FRAMES * RECORDING_FRAME_BYTES)
+        self._pending = self._frame_pool.acquire()
+        self._pending_len = 0
+        self._pending_frames = 0
+        self._draining = False
+        self._close_pending = False
 
     def __del__(self):
         self.close_recorder()
@@ -21,7 +38,7 @@ class RecordingPort(pj.AudioMediaPort):
     def __exit__(self, *args):
         self.close_recorder()
 
-    def create_recorder(self, name):
+    def create_recorder(self, name, expected_duration_sec: float = 0.0, fsync_on_close: bool = False):
         fmt = pj.MediaFormatAudio()
         fmt.type = pj.PJMEDIA_TYPE_AUDIO
         fmt.clockRate = 16000
@@ -29,18 +46,71 @@ class RecordingPort(pj.AudioMediaPort):
         fmt.bitsPerSample = 16
         fmt.frameTimeUsec = 60000
         self.createPort(f"{name}", fmt)
-        self.wav_file = AsyncWavWriter(name, channels=1, sampwidth=2, framerate=16000)
-        AsyncCallbackJob(self.wav_file.open).submit()
+        self.wav_file = AsyncWavWriter(name, channels=1, sampwidth=2, framerate=16000,
+                                       expected_duration_sec=expected_duration_sec,
+                                       release_cb=self._frame_pool.release,
+                                       fsync_on_close=fsync_on_close)
+        self._schedule_drain(self.wav_file)
 
     def close_recorder(self):
-        if self.wav_file:
-            AsyncCallbackJob(self.wav_file.close).submit()
+        wav_file = self.wav_file
+        if wav_file:
             self.wav_file = None
+            with self._lock:
+                self._close_pending = True
+            self._schedule_drain(wav_file)
 
     def onFrameRequested(self, frame):
         frame.type = pj.PJMEDIA_FRAME_TYPE_AUDIO
 
     def onFrameReceived(self, frame):
-        byte_data = bytes(frame.buf)
-        if byte_data:
-            AsyncCallbackJob(self.wav_file.write_chunk, byte_data).submit()
+        wav_file = self.wav_file
+        if wav_file is None or not frame.size:
+            return
+        with self._lock:
+            # close_recorder may have run since the check; such a frame belongs to no recording
+            if self.wav_file is not wav_file:
+                return
+            # frame.buf is a SWIG ByteVector without the buffer protocol; it is copied straight into
+            # the pending buffer, in place while it fits and growing the buffer otherwise
+            data = frame.buf
+            end = self._pending_len + len(data)
+            self._pending[self._pending_len:end] = data
+            self._pending_len = end
+            self._pending_frames += 1
+            if self._pending_frames < RECORDING_BATCH_FRAMES:
+                return
+        self._schedule_drain(wav_file)
+
+    def _schedule_drain(self, wav_file: AsyncWavWriter):
+        with self._lock:
+            if self._draining:
+                return
+            self._draining = True
+        AsyncCallbackJob(self._drain, wav_file).submit(self.loop)
+
+    async def _drain(self, wav_file: AsyncWavWriter):
+        try:
+            await wav_file.open()
+            while True:
+                with self._lock:
+                    if not self._close_pending and self._pending_frames < RECORDING_BATCH_FRAMES:
+                        self._draining = False
+                        return
+                    chunks, length = self._pending, self._pending_len
+                    self._pending = self._frame_pool.acquire()
+                    self._pending_len = 0
+                    self._pending_frames = 0
+                if not length:
+                    self._frame_pool.release(chunks)
+                    break
+                # Frames that arrived while the previous write was in flight go out as one write
+                await wav_file.write_pooled(chunks, length)
+            await wav_file.close()
+        except BaseException:
+            with self._lock:
+                self._draining = False
+            raise
+        with self._lock:
+            self._close_pending = False
+            self._draining = False
@@ -3,13 +3,23 @@ import logging
 import os
 from datetime import datetime
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List
 
 import dotenv
 
 logger = logging.getLogger(__name__)
 
 
+def _env_bool(name: str, default: bool) -> bool:
+    # Same rule as the C++ port: only a case-insensitive "true" is true
+    value = os.environ.get(name)
+    return default if value is None else value.lower() == "true"
+
+
+def _split_csv(value: str) -> List[str]:
+    return [item for item in (s.strip() for s in value.split(",")) if item]
+
+
 class Config(object):
     def __init__(self):
         dotenv.load_dotenv(override=True)
@@ -18,25 +28,26 @@ class Config(object):
         self.sip_domain = os.environ.get("SIP_DOMAIN", "sip.linphone.org")
         self.sip_password = os.environ.get("SIP_PASSWORD", "password")
         self.sip_caller_id = os.environ.get("SIP_CALLER_ID", None)
-        self.sip_null_device = os.environ.get("SIP_NULL_DEVICE", "True").lower() == "true"
+        self.sip_null_device = _env_bool("SIP_NULL_DEVICE", True)
         self.tmp_audio_dir = os.environ.get("SIP_AUDIO_TMP_DIR", str(Path(os.environ.get("SIP_AUDIO_DIR", os.getcwd()))/"tmp"))
         self.sip_audio_dir = os.environ.get("SIP_AUDIO_WAV_DIR", str(Path(os.environ.get("SIP_AUDIO_DIR", os.getcwd()))/"wav"))
         self.sip_port = int(os.environ.get("SIP_PORT", "5060"))
-        self.sip_use_tcp = os.environ.get("SIP_USE_TCP", "True").lower() == "true"
-        self.sip_use_ice = os.environ.get("SIP_USE_ICE", "False").lower() == "true"
-        self.sip_stun_servers = [s.strip() for s in os.environ.get("SIP_STUN_SERVERS", "").split(",") if
-                                 not s.isspace() and s != ""]
-        self.sip_proxy_servers = [s.strip() for s in os.environ.get("SIP_PROXY_SERVERS", "").split(",") if
-                                  not s.isspace() and s != ""]
+        self.sip_use_tcp = _env_bool("SIP_USE_TCP", True)
+        self.sip_use_ice = _env_bool("SIP_USE_ICE", False)
+        self.sip_stun_servers = _split_csv(os.environ.get("SIP_STUN_SERVERS", ""))
+        self.sip_proxy_servers = _split_csv(os.environ.get("SIP_PROXY_SERVERS", ""))
         self.events_delay = float(os.environ.get("EVENTS_DELAY", "0.010"))  # sec.
         self.async_delay = float(os.environ.get("ASYNC_DELAY", "0.005"))  # sec.
         self.frame_time_usec = int(os.environ.get("FRAME_TIME_USEC", "60000"))
         self.vad_model_path = str(Path(os.environ.get("VAD_MODEL_PATH", os.getcwd()))/"silero_vad.onnx")
         self.vad_model_url = os.environ.get("VAD_MODEL_URL", "https://huggingface.co/onnx-community/silero-vad/resolve/main/onnx/model.onnx")
-        self.ua_zero_thread_cnt = os.environ.get("UA_ZERO_THREAD_CNT", "True").lower() == "true"
-        self.ua_main_thread_only = os.environ.get("UA_MAIN_THREAD_ONLY", "True").lower() == "true"
+        self.ua_zero_thread_cnt = _env_bool("UA_ZERO_THREAD_CNT", True)
+        self.ua_main_thread_only = _env_bool("UA_MAIN_THREAD_ONLY", True)
+        # Worker thread counts; keep them at or below the physical core count
+        self.ua_thread_cnt = int(os.environ.get("UA_THREAD_CNT", 1))
+        self.sip_media_thread_cnt = int(os.environ.get("SIP_MEDIA_THREAD_CNT", 1))
         self.ec_tail_len = int(os.environ.get("EC_TAIL_LEN", "200"))
-        self.ec_no_vad = os.environ.get("EC_NO_VAD", "False").lower() == "true"
+        self.ec_no_vad = _env_bool("EC_NO_VAD", False)
         self.log_level = os.environ.get("LOG_LEVEL", "INFO")
         log_filename = os.environ.get("LOG_FILENAME", "")
         if log_filename:
@@ -52,12 +63,27 @@ class Config(object):
         self.pjsip_log_level = int(os.environ.get("PJSIP_LOG_LEVEL", 1))
 
         self.vad_sampling_rate = int(os.environ.get("VAD_SAMPLING_RATE", 16000))
+        self.vad_quantize = _env_bool("VAD_QUANTIZE", False)
+        # INT8 model to load instead of VAD_MODEL_PATH; with VAD_QUANTIZE it is where the quantized copy is written
+        self.vad_quantized_model_path = os.environ.get("VAD_QUANTIZED_MODEL_PATH") or None
+        # Peak amplitude (of 1.0 full scale) at or below which a window is treated as silence without inference
+        self.vad_silence_floor = float(os.environ.get("VAD_SILENCE_FLOOR", 5e-4))
+        self.vad_intra_op_threads = int(os.environ.get("VAD_INTRA_OP_THREADS", 1))
+        self.vad_cache_optimized = _env_bool("VAD_CACHE_OPTIMIZED", False)
+        # Run VAD on a dedicated thread fed directly from the PJSIP media thread; disables VAD_BATCHING
+        self.vad_worker_thread = _env_bool("VAD_WORKER_THREAD", False)
+        self.vad_worker_max_pending = int(os.environ.get("VAD_WORKER_MAX_PENDING", 1024))
+        # Audio frames queued from PJSIP threads for the asyncio loop; the oldest are dropped on overflow
+        self.callback_queue_max_pending = int(os.environ.get("CALLBACK_QUEUE_MAX_PENDING", 1024))
+        self.vad_batching = _env_bool("VAD_BATCHING", False)
+        self.vad_batch_max_size = int(os.environ.get("VAD_BATCH_MAX_SIZE", 32))
+        self.vad_batch_wait_ms = float(os.environ.get("VAD_BATCH_WAIT_MS", 3))
         self.vad_threshold = float(os.environ.get("VAD_THRESHOLD", 0.65))
         self.vad_min_speech_duration_ms = int(os.environ.get("VAD_MIN_SPEECH_DURATION_MS", 150))
         self.vad_min_silence_duration_ms = int(os.environ.get("VAD_MIN_SILENCE_DURATION_MS", 300))
         self.vad_speech_pad_ms = int(os.environ.get("VAD_SPEECH_PAD_MS", 700))
         self.vad_speech_prob_window = int(os.environ.get("VAD_SPEECH_PROB_WINDOW", 3))
-        self.vad_correction_debug = os.getenv("VAD_CORRECTION_DEBUG", "false").lower() == "true"
+        self.vad_correction_debug = _env_bool("VAD_CORRECTION_DEBUG", False)
         self.vad_correction_enter_thres = float(os.getenv("VAD_CORRECTION_ENTER_THRESHOLD", 0.6))
         self.vad_correction_exit_thres = float(os.getenv("VAD_CORRECTION_EXIT_THRESHOLD", 0.4))
 
@@ -69,15 +95,37 @@ class Config(object):
         self.sip_rest_api_port = int(os.environ.get("SIP_REST_API_PORT", "8000"))
         self.base_path = str(Path(__file__).parent)
 
-        self.use_local_stt = bool(os.environ.get("USE_LOCAL_STT", "false").lower() == "true")
+        self.use_local_stt = _env_bool("USE_LOCAL_STT", False)
         self.local_stt_url = str(os.environ.get("LOCAL_STT_URL", ""))
         self.local_stt_lang = str(os.environ.get("LOCAL_STT_LANG", "en"))
+        # POST raw 16-bit PCM as application/octet-stream instead of a multipart WAV upload
+        self.local_stt_raw_pcm = _env_bool("LOCAL_STT_RAW_PCM", False)
+        # Coalesce local STT requests from concurrent calls into one POST to LOCAL_STT_BATCH_URL
+        self.local_stt_batching = _env_bool("LOCAL_STT_BATCHING", False)
+        self.local_stt_batch_url = str(os.environ.get("LOCAL_STT_BATCH_URL", self.local_stt_url.rstrip("/") + "/batch"))
+        self.local_stt_batch_max_size = int(os.environ.get("LOCAL_STT_BATCH_MAX_SIZE", 8))
+        self.local_stt_batch_wait_ms = float(os.environ.get("LOCAL_STT_BATCH_WAIT_MS", 10))
+        if self.local_stt_raw_pcm and self.local_stt_batching:
+            # The batch endpoint takes multipart WAV files only
+            logger.warning("LOCAL_STT_BATCHING is ignored with LOCAL_STT_RAW_PCM. [local_stt_url=%s]", self.local_stt_url)
+            self.local_stt_batching = False
 
         self.greeting_delay_sec = float(os.environ.get("GREETING_DELAY_SEC", "0.0"))
         self.codecs_priority: Dict[str, int] = json.loads(os.environ.get("CODECS_PRIORITY",
                                                                          '{"opus/48000":254,"G722/16000":253}'))
-        self.interruptions_are_allowed = os.environ.get("INTERRUPTIONS_ARE_ALLOWED", "true").lower() == "true"
-        self.record_audio_parts = os.environ.get("RECORD_AUDIO_PARTS", "false").lower() == "true"
+        self.interruptions_are_allowed = _env_bool("INTERRUPTIONS_ARE_ALLOWED", True)
+        self.record_audio_parts = _env_bool("RECORD_AUDIO_PARTS", False)
+        # Call recording length reserved on disk when the recording opens, 0 lets the file grow
+        self.recording_preallocate_sec = float(os.environ.get("RECORDING_PREALLOCATE_SEC", 0))
+        # Sync call recordings to disk on close; recordings ending together share one sync job
+        self.recording_fsync = _env_bool("RECORDING_FSYNC", False)
+        # TTS messages waiting to be played per call; the oldest is dropped on overflow
+        self.max_queued_messages = max(1, int(os.environ.get("MAX_QUEUED_MESSAGES", 64)))
+        # Write TTS audio to SIP_AUDIO_TMP_DIR and keep it instead of playing it from memory
+        self.keep_tts_wav = _env_bool("KEEP_TTS_WAV", False)
 
 
 sip_config = Config()
+# Read on every long pause; bound once as module globals
+RECORD_AUDIO_PARTS: bool = sip_config.record_audio_parts
+SIP_AUDIO_DIR: str = sip_config.sip_audio_dir
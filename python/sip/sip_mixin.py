@@ -9,7 +9,7 @@ from aiohttp import web
 from aiohttp.web_request import Request
 
 from src.backend.client_app_mixin import ClientAppMixin
-from src.backend.client_bot_base import ClientBotSession
+from src.backend.client_bot_base import ClientBotSession, _json_dumps, _json_loads
 from src.integrations.sip.audio_message import AudioMessage
 from src.integrations.sip.pjcall import PjCall
 
@@ -72,11 +72,12 @@ class SipAppMixin(ClientAppMixin, ABC):
         """
         session: Optional[PjCall] = None
         try:
-            body = await request.json()
+            body = await request.json(loads=_json_loads)
             to_uri = body["to_uri"]
             env_info = body.get("env_info", {})
             communication_id = body.get("communication_id", None)
-            logger.info("Making outbound call. [to_uri=%s, env_info=%s, communication_id=%s]", to_uri, env_info, communication_id)
+            # env_info is not logged: it is caller-supplied data of arbitrary size and may carry PII
+            logger.info("Making outbound call. [to_uri=%s, communication_id=%s]", to_uri, communication_id)
             session = await self.start_session(to_uri, "", self.get_app_name(), "", communication_id=communication_id, **env_info)
             greeting = session.metadata.get('initialization_response', {}).get('greeting')
             if greeting:
@@ -85,7 +86,7 @@ class SipAppMixin(ClientAppMixin, ABC):
                 session.metadata['greeting_message'] = message
             call_param = pj.CallOpParam(True)
             session.makeCall(to_uri, call_param)
-            return web.json_response({'message': 'ok', "session_id": session.session_id}, status=200)
+            return web.json_response({'message': 'ok', "session_id": session.session_id}, status=200, dumps=_json_dumps)
         except Exception as exc:
             message = exc.reason if hasattr(exc, "reason") else str(exc)
             try:
@@ -95,7 +96,7 @@ class SipAppMixin(ClientAppMixin, ABC):
                     await session.close_session("failed")
             except Exception as e:
                 logger.error("Error during call cleanup. [error=%s]", message, exc_info=e)
-            return web.json_response({'message': message}, status=500)
+            return web.json_response({'message': message}, status=500, dumps=_json_dumps)
 
     async def _make_transfer(self, request: Request):
         """
@@ -141,18 +142,18 @@ class SipAppMixin(ClientAppMixin, ABC):
         session_id = request.match_info['session_id']
         session: Optional[PjCall] = self.get_session(session_id)
         if not session:
-            return web.json_response({"status": "error", "message": "Session not found"}, status=404)
+            return web.json_response({"status": "error", "message": "Session not found"}, status=404, dumps=_json_dumps)
         try:
             if session.getInfo().state != pj.PJSIP_INV_STATE_CONFIRMED:
-                return web.json_response({"status": "error", "message": "Call is not active"}, status=400)
-            body = await request.json()
+                return web.json_response({"status": "error", "message": "Call is not active"}, status=400, dumps=_json_dumps)
+            body = await request.json(loads=_json_loads)
             to_uri = body['to_uri']
             session.to_uri = to_uri
             logger.debug("Transfer URI set. [to_uri=%s, session_id=%s]", session.to_uri, session.session_id)
             if 'transfer_delay' in body:
                 logger.debug("Transfer delay set. [delay=%s, session_id=%s]", body['transfer_delay'], session.session_id)
                 session.transfer_delay = float(body['transfer_delay'])
-            return web.json_response({"status": "ok", "message": f"Successfully transferred", "session_id": session.session_id, "to_uri": to_uri}, status=200)
+            return web.json_response({"status": "ok", "message": f"Successfully transferred", "session_id": session.session_id, "to_uri": to_uri}, status=200, dumps=_json_dumps)
         except Exception as exc:
             message = exc.reason if hasattr(exc, "reason") else str(exc)
             logger.error("Failed to transfer call. [error=%s, session_id=%s]", message, session_id, exc_info=exc)
@@ -162,7 +163,7 @@ class SipAppMixin(ClientAppMixin, ABC):
                     await session.close_session("failed")
             except Exception as e:
                 logger.error("Error during transfer cleanup. [error=%s, session_id=%s]", str(e), session_id)
-            return web.json_response({"status": "error", "message": message}, status=500)
+            return web.json_response({"status": "error", "message": message}, status=500, dumps=_json_dumps)
 
     def run(self, *args, **kwargs):
         super().run(*args, port=self.config["FLAMETREE_CALLBACK_PORT"], **kwargs)
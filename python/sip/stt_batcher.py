@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+def stt_text(data) -> str:
+    """Extracts the transcription from one STT server result, either a bare string or {"text": ...}."""
+    return data if isinstance(data, str) else '' if not isinstance(data, dict) else data.get("text")
+
+
+class STTBatcher:
+    """Collects local STT requests from concurrent calls and posts them as one multipart request.
+
+    The batch endpoint receives the WAVs as fields file0..fileN plus lang, and answers with a JSON
+    list holding one result per file, in the same order.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, url: str, lang: str,
+                 max_batch_size: int = 8, max_wait_ms: float = 10.0):
+        self.session = session
+        self.url = url
+        self.lang = lang
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[Tuple[bytes, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._requests: set = set()
+
+    async def submit(self, wav: bytes) -> str:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((wav, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        task = asyncio.get_running_loop().create_task(self._post(pending))
+        self._requests.add(task)
+        task.add_done_callback(self._requests.discard)
+
+    async def _post(self, pending: List[Tuple[bytes, asyncio.Future]]):
+        form_data = aiohttp.FormData()
+        for i, (wav, _) in enumerate(pending):
+            form_data.add_field(f'file{i}', wav, filename=f'file{i}.wav', content_type='audio/wav')
+        form_data.add_field('lang', self.lang, content_type='text/plain')
+        try:
+            async with self.session.post(self.url, data=form_data) as response:
+                if response.status != 200:
+                    raise Exception(f"Unable to post audio batch to server. Status code: {response.status},"
+                                    f" batch_size: {len(pending)}")
+                results = await response.json()
+            if not isinstance(results, list) or len(results) != len(pending):
+                raise Exception(f"Unexpected audio batch response. [batch_size={len(pending)}]")
+        except Exception as e:
+            logger.error("Batched transcription error. [batch_size=%s, error=%s]", len(pending), e)
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(stt_text(result))
+
+    def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        for _, future in pending:
+            if not future.done():
+                future.cancel()
+        for task in self._requests:
+            task.cancel()
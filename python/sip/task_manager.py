@@ -6,35 +6,41 @@ from typing import Dict, Coroutine
 
 logger = logging.getLogger(__name__)
 
-class TaskName(Enum):
+# str mixin: members hash with the C str hash, which matters for the per-frame `TaskName.COMMIT in tasks`,
+# and format as their value, so %s needs no .value lookup
+class TaskName(str, Enum):
     START = "START"
     COMMIT = "COMMIT"
     # ROLLBACK = "ROLLBACK"
 
+    __str__ = str.__str__
+
 
 class TaskManager(Dict[TaskName, Task]):
+    # No instance __dict__; lookups keep using the inherited C dict slots
+    __slots__ = ()
 
     async def await_and_delete(self, name: TaskName):
         if name in self:
-            logger.debug("Awaiting task. [task_name=%s]", name.value)
+            logger.debug("Awaiting task. [task_name=%s]", name)
             await self.pop(name)
             return True
         return False
 
     def cancel_and_delete(self, name: TaskName):
         if name in self:
-            logger.debug("Cancelling task. [task_name=%s]", name.value)
+            logger.debug("Cancelling task. [task_name=%s]", name)
             self.pop(name).cancel()
             return True
         return False
 
     def create_task(self, name: TaskName, coro: Coroutine):
-        logger.debug("Creating task. [task_name=%s, coroutine=%s]", name.value, coro)
+        logger.debug("Creating task. [task_name=%s, coroutine=%s]", name, coro)
         self[name] = asyncio.create_task(coro)
 
     def cancel_all_tasks(self):
-        tasks = list(self.values())
-        self.clear()
-        for task in tasks:
-            task.cancel()
+        while self:
+            _, task = self.popitem()
+            if not task.done():
+                task.cancel()
 
@@ -1,8 +1,13 @@
+import asyncio
+import functools
 import logging
+import math
 import os
+import threading
+import time
 from collections import deque
 from pathlib import Path
-from typing import Optional, Callable
+from typing import Optional, Callable, List, Tuple
 
 import numpy as np
 import onnxruntime
@@ -14,18 +19,138 @@ logger = logging.getLogger(__name__)
 logging.getLogger("onnxruntime").setLevel(logging.WARNING)
 
 
+def _fade_linear(fade_length: int) -> np.ndarray:
+    return np.linspace(0.0, 1.0, fade_length)
+
+
+def _fade_cosine(fade_length: int) -> np.ndarray:
+    return np.sin(np.linspace(0, np.pi / 2, fade_length))
+
+
+def _fade_exponential(fade_length: int) -> np.ndarray:
+    fade_curve = np.exp(np.linspace(-4, 0, fade_length)) - np.exp(-4)
+    return fade_curve / fade_curve[-1]  # Normalize to 0-1 range
+
+
+def _fade_log(fade_length: int) -> np.ndarray:
+    fade_curve = np.log(np.linspace(0.1, 1, fade_length) * 9 + 1)
+    return fade_curve / fade_curve[-1]  # Normalize to 0-1 range
+
+
+_FADE_CURVES = {
+    'linear': _fade_linear,
+    'cosine': _fade_cosine,
+    'exponential': _fade_exponential,
+    'log': _fade_log,
+}
+
+
+@functools.lru_cache(maxsize=64)
+def _fade_curve(curve: str, fade_length: int, fade_in: bool) -> np.ndarray:
+    """Fade curve per (curve, length, direction); pads and silence tails repeat a handful of lengths."""
+    make_curve = _FADE_CURVES.get(curve)
+    if make_curve is None:
+        raise ValueError(f"Wrong curve {curve}")
+    fade_curve = make_curve(fade_length)
+    if not fade_in:
+        fade_curve = fade_curve[::-1]
+    # Contiguous float32 so applying it is a single multiply over the audio; shared, hence read-only
+    fade_curve = np.ascontiguousarray(fade_curve, dtype=np.float32)
+    fade_curve.flags.writeable = False
+    return fade_curve
+
+
 class VADModel:
     def __init__(
             self,
             model_path: Path,
-            sampling_rate: int = 16000
+            sampling_rate: int = 16000,
+            quantize: bool = False,
+            intra_op_threads: int = 1,
+            cache_optimized: bool = False,
+            quantized_model_path: Optional[Path] = None,
+            silence_floor: float = 0.0
     ):
-        """Initialize the VAD engine."""
+        """Initialize the VAD engine. One instance is shared by all calls."""
         self.sampling_rate = sampling_rate
-
-        self.session = self._load_model(model_path)
+        # Windows whose peak amplitude does not exceed the floor score 0.0 without running the model
+        self.silence_floor = max(0.0, silence_floor)
+
+        if quantize:
+            model_path = self._quantize_model(model_path, quantized_model_path)
+        elif quantized_model_path is not None and quantized_model_path.is_file():
+            # A model quantized ahead of time is used as is
+            model_path = quantized_model_path
+            quantize = True
+        if quantize:
+            logger.info("Using INT8 VAD model. [path=%s, cpu_vnni=%s]", model_path, self._cpu_has_vnni())
+        self.session = self._load_model(model_path, intra_op_threads, cache_optimized)
         self.input_names = [input.name for input in self.session.get_inputs()]
         self.output_names = [output.name for output in self.session.get_outputs()]
+        # Outputs are read by position from session.run; the probability falls back to the first output
+        self._output_idx = self.output_names.index('output') if 'output' in self.output_names else 0
+        self._state_idx = self.output_names.index('stateN') if 'stateN' in self.output_names else None
+        self.batch_supported = True
+        self.window_size_samples = 512
+        # Read-only inputs shared by every run instead of being rebuilt per window
+        self._sr = np.array(self.sampling_rate, dtype=np.int64)
+        self._zero_state = np.zeros((2, 1, 128), dtype=np.float32)
+        self._bound = self._bind_buffers()
+        self._bound_lock = threading.Lock()
+        # Stacked batch inputs, grown to the largest batch seen; only VADBatcher's loop thread uses them
+        self._batch_input = np.zeros((0, self.window_size_samples), dtype=np.float32)
+        self._batch_state = np.zeros((2, 0, 128), dtype=np.float32)
+
+    def _bind_buffers(self) -> Optional[dict]:
+        """Bind preallocated input/output buffers so single-window inference allocates nothing on the ORT side."""
+        if {'input', 'state'} - set(self.input_names) or {'output', 'stateN'} - set(self.output_names):
+            return None
+        try:
+            buffers = {
+                'input': np.zeros((1, self.window_size_samples), dtype=np.float32),
+                'state': np.zeros((2, 1, 128), dtype=np.float32),
+                'output': np.zeros((1, 1), dtype=np.float32),
+                'stateN': np.zeros((2, 1, 128), dtype=np.float32),
+            }
+            binding = self.session.io_binding()
+            for name in ('input', 'state'):
+                binding.bind_ortvalue_input(name, onnxruntime.OrtValue.ortvalue_from_numpy(buffers[name]))
+            if 'sr' in self.input_names:
+                buffers['sr'] = self._sr
+                binding.bind_cpu_input('sr', buffers['sr'])
+            for name in ('output', 'stateN'):
+                binding.bind_ortvalue_output(name, onnxruntime.OrtValue.ortvalue_from_numpy(buffers[name]))
+            buffers['binding'] = binding
+            return buffers
+        except Exception as e:
+            logger.warning("IO binding unavailable, using session.run. [error=%s]", e)
+            return None
+
+    def _run_bound(self, audio_chunk: np.ndarray, state: Optional[np.ndarray], scale: Optional[float] = None) -> tuple:
+        bound = self._bound
+        # The bound buffers are shared by all calls
+        with self._bound_lock:
+            if scale is None:
+                np.copyto(bound['input'][0], audio_chunk)
+            else:
+                np.divide(audio_chunk, scale, out=bound['input'][0])
+            if state is not None:
+                np.copyto(bound['state'], state)
+            else:
+                bound['state'].fill(0.0)
+            self.session.run_with_iobinding(bound['binding'])
+            return float(bound['output'][0][0]), bound['stateN'].copy()
+
+    def create_stream(self, initial_state: Optional[np.ndarray]) -> Optional["VADStream"]:
+        """Per-call bound buffers for single-window inference; None when the model cannot be bound."""
+        if self._bound is None:
+            return None
+        try:
+            return VADStream(self.session, self.window_size_samples, self._sr if 'sr' in self.input_names else None,
+                             initial_state, self.silence_floor)
+        except Exception as e:
+            logger.warning("Per-stream IO binding unavailable. [error=%s]", e)
+            return None
 
     def initialize_state(self):
         silence = np.zeros((1, 512), dtype=np.float32)  # silence chunk
@@ -39,8 +164,7 @@ class VADModel:
 
         try:
             outputs = self.session.run(self.output_names, inputs)
-            output_dict = dict(zip(self.output_names, outputs))
-            initialized_state = output_dict.get('stateN', default_state)
+            initialized_state = outputs[self._state_idx] if self._state_idx is not None else default_state
 
             logger.debug("Model state initialized. [sampling_rate=%s]", self.sampling_rate)
             return initialized_state
@@ -50,7 +174,39 @@ class VADModel:
             return default_state
 
     @staticmethod
-    def _load_model(model_path: Path) -> onnxruntime.InferenceSession:
+    def _cpu_has_vnni() -> Optional[bool]:
+        """Whether the CPU has the VNNI int8 dot product ORT uses for quantized MatMul; None if unknown."""
+        try:
+            with open("/proc/cpuinfo") as f:
+                for line in f:
+                    if line.startswith("flags"):
+                        flags = line.split()
+                        return "avx512_vnni" in flags or "avx_vnni" in flags
+        except OSError:
+            pass
+        return None
+
+    @staticmethod
+    def _quantize_model(model_path: Path, quantized_path: Optional[Path] = None) -> Path:
+        """Return an INT8 dynamically quantized copy of the model, (re)creating it when missing or stale.
+
+        The copy is written next to the original unless quantized_path is given.
+        """
+        if quantized_path is None:
+            quantized_path = model_path.with_name(model_path.stem + ".int8" + model_path.suffix)
+        if not quantized_path.is_file() or quantized_path.stat().st_mtime < model_path.stat().st_mtime:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            logger.info("Quantizing VAD model. [source=%s, target=%s]", model_path, quantized_path)
+            quantize_dynamic(str(model_path), str(quantized_path), weight_type=QuantType.QInt8)
+        return quantized_path
+
+    @staticmethod
+    def _optimized_model_path(model_path: Path) -> Path:
+        return model_path.with_name(model_path.stem + ".opt" + model_path.suffix)
+
+    @staticmethod
+    def _load_model(model_path: Path, intra_op_threads: int = 1,
+                    cache_optimized: bool = False) -> onnxruntime.InferenceSession:
         if not model_path.exists():
             raise FileNotFoundError("Model file not found: %s" % model_path)
 
@@ -58,17 +214,34 @@ class VADModel:
             # Configure session for best performance
             session_options = onnxruntime.SessionOptions()
             session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
-
-            # Set optimal threads based on system
-            import multiprocessing
-            cpu_count = max(1, multiprocessing.cpu_count())
-            session_options.intra_op_num_threads = min(4, cpu_count)
+            if cache_optimized:
+                # The first load saves the optimized graph, later cold starts load it without re-optimizing
+                optimized_path = VADModel._optimized_model_path(model_path)
+                if optimized_path.is_file() and optimized_path.stat().st_mtime >= model_path.stat().st_mtime:
+                    logger.info("Loading cached optimized VAD model. [path=%s]", optimized_path)
+                    model_path = optimized_path
+                    session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+                else:
+                    session_options.optimized_model_filepath = str(optimized_path)
+
+            # Single-window inference is too small to benefit from a thread pool
+            # and would compete with the PJSIP media thread. The session is shared by every call,
+            # so this is already the process-wide VAD pool; it never gets more threads than cores
+            intra_op_threads = max(1, min(intra_op_threads, os.cpu_count() or 1))
+            session_options.intra_op_num_threads = intra_op_threads
             session_options.inter_op_num_threads = 1
-            session_options.enable_mem_pattern = False
-
-            # Load model with available providers
-            providers = onnxruntime.get_available_providers()
-            logger.info("Available ONNX providers. [providers=%s]", providers)
+            if intra_op_threads > 1:
+                # Idle pool threads would otherwise spin between the short VAD runs, taking cores from media threads
+                session_options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+            # Single windows always run at (1, 512) with a fixed state shape, so the planned activation
+            # layout is reused run after run; batches of other sizes get their own cached pattern
+            session_options.enable_mem_pattern = True
+            session_options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+            # One session is shared by all calls; its arena keeps tensor memory for reuse across inferences
+            session_options.enable_cpu_mem_arena = True
+
+            providers = ["CPUExecutionProvider"]
+            logger.info("ONNX providers. [providers=%s]", providers)
 
             session = onnxruntime.InferenceSession(str(model_path), session_options, providers=providers)
 
@@ -87,28 +260,41 @@ class VADModel:
 
     def get_speech_prob(self, audio_chunk: np.ndarray, state: Optional[np.ndarray] = None) -> tuple:
         # Handle silent or empty chunks
-        if len(audio_chunk) == 0 or np.abs(audio_chunk).max() == 0:
+        if len(audio_chunk) == 0:
             return 0.0, state
+        # Peak amplitude from two reductions, without the temporary array of np.abs
+        return self._speech_prob(audio_chunk, state, max(audio_chunk.max(), -audio_chunk.min()))
 
-        # Normalize audio to range [-1, 1]
-        max_amp = np.abs(audio_chunk).max()
-        if max_amp > 1.0 or max_amp < 0.01:
-            audio_chunk /= max_amp
+    def _speech_prob(self, audio_chunk: np.ndarray, state: Optional[np.ndarray], max_amp: float) -> tuple:
+        """get_speech_prob for a non-empty chunk whose peak amplitude the caller already has."""
+        if max_amp <= self.silence_floor:
+            return 0.0, state
+
+        # Normalize audio to range [-1, 1]; the caller's chunk is left untouched
+        scale = max_amp if max_amp > 1.0 or max_amp < 0.01 else None
 
+        if self._bound is not None and len(audio_chunk) == self.window_size_samples:
+            try:
+                return self._run_bound(audio_chunk, state, scale)
+            except Exception as e:
+                logger.error("Inference error. [error=%s]", e)
+                return 0.0, state
+
+        if scale is not None:
+            audio_chunk = audio_chunk / scale
         inputs = {'input': audio_chunk.reshape(1, -1)}
 
         if 'sr' in self.input_names:
-            inputs['sr'] = np.array(self.sampling_rate, dtype=np.int64)
+            inputs['sr'] = self._sr
 
         if 'state' in self.input_names:
-            inputs['state'] = state if state is not None else np.zeros((2, 1, 128), dtype=np.float32)
+            inputs['state'] = state if state is not None else self._zero_state
 
         try:
             outputs = self.session.run(self.output_names, inputs)
-            output_dict = dict(zip(self.output_names, outputs))
 
-            prob = float(output_dict['output'][0])
-            new_state = output_dict.get('stateN', None)
+            prob = float(outputs[self._output_idx][0])
+            new_state = outputs[self._state_idx] if self._state_idx is not None else None
 
             return prob, new_state
 
@@ -116,6 +302,278 @@ class VADModel:
             logger.error("Inference error. [error=%s]", e)
             return 0.0, state
 
+    def get_speech_probs(self, audio_chunks: List[np.ndarray], states: List[Optional[np.ndarray]]) -> List[tuple]:
+        """Run one inference over windows of several streams, each with its own state.
+
+        The windows are normalized straight into a preallocated (N, 512) input, so the callers' chunks are
+        left untouched. Not thread-safe: batches are run from the event loop only.
+        """
+        results: List[tuple] = [(0.0, state) for state in states]
+        batch_index = []
+        peaks = []
+        scales = []
+        for i, audio_chunk in enumerate(audio_chunks):
+            if len(audio_chunk) == 0:
+                continue
+            max_amp = max(audio_chunk.max(), -audio_chunk.min())
+            if max_amp <= self.silence_floor:
+                continue
+            batch_index.append(i)
+            peaks.append(max_amp)
+            scales.append(max_amp if max_amp > 1.0 or max_amp < 0.01 else None)
+        if not batch_index:
+            return results
+        if len(batch_index) == 1 or not self.batch_supported \
+                or any(len(audio_chunks[i]) != self.window_size_samples for i in batch_index):
+            for i, max_amp in zip(batch_index, peaks):
+                results[i] = self._speech_prob(audio_chunks[i], states[i], max_amp)
+            return results
+
+        n = len(batch_index)
+        if self._batch_input.shape[0] < n:
+            self._batch_input = np.zeros((n, self.window_size_samples), dtype=np.float32)
+            self._batch_state = np.zeros((2, n, 128), dtype=np.float32)
+        batch_input = self._batch_input[:n]
+        for row, i, scale in zip(batch_input, batch_index, scales):
+            if scale is not None:
+                np.divide(audio_chunks[i], scale, out=row)
+            else:
+                np.copyto(row, audio_chunks[i])
+        inputs = {'input': batch_input}
+        if 'sr' in self.input_names:
+            inputs['sr'] = self._sr
+        if 'state' in self.input_names:
+            batch_state = self._batch_state[:, :n, :]
+            for row, i in enumerate(batch_index):
+                batch_state[:, row:row + 1, :] = states[i] if states[i] is not None else self._zero_state
+            inputs['state'] = batch_state
+        try:
+            outputs = self.session.run(self.output_names, inputs)
+        except Exception as e:
+            # Models exported without a dynamic batch axis cannot be batched
+            logger.warning("Batched inference failed, falling back to per-stream runs. [error=%s]", e)
+            self.batch_supported = False
+            for i, max_amp in zip(batch_index, peaks):
+                results[i] = self._speech_prob(audio_chunks[i], states[i], max_amp)
+            return results
+
+        probs = outputs[self._output_idx]
+        new_states = outputs[self._state_idx] if self._state_idx is not None else None
+        for row, i in enumerate(batch_index):
+            new_state = new_states[:, row:row + 1, :] if new_states is not None else None
+            results[i] = (float(probs[row][0]), new_state)
+        return results
+
+
+class VADStream:
+    """One call's Silero state kept in two bound buffers that swap roles after every run.
+
+    Each buffer is the state input of one IOBinding and the stateN output of the other, so the
+    state never round-trips through fresh arrays and streams do not share buffers or a lock.
+    """
+
+    __slots__ = ("session", "input", "output", "silence_floor", "_states", "_bindings", "_current")
+
+    def __init__(self, session: onnxruntime.InferenceSession, window_size_samples: int,
+                 sr: Optional[np.ndarray], initial_state: Optional[np.ndarray], silence_floor: float = 0.0):
+        self.session = session
+        self.silence_floor = silence_floor
+        self.input = np.zeros((1, window_size_samples), dtype=np.float32)
+        self.output = np.zeros((1, 1), dtype=np.float32)
+        self._states = (np.zeros((2, 1, 128), dtype=np.float32), np.zeros((2, 1, 128), dtype=np.float32))
+        if initial_state is not None:
+            np.copyto(self._states[0], initial_state)
+        input_value = onnxruntime.OrtValue.ortvalue_from_numpy(self.input)
+        output_value = onnxruntime.OrtValue.ortvalue_from_numpy(self.output)
+        state_values = [onnxruntime.OrtValue.ortvalue_from_numpy(state) for state in self._states]
+        bindings = []
+        for i in (0, 1):
+            binding = session.io_binding()
+            binding.bind_ortvalue_input('input', input_value)
+            binding.bind_ortvalue_input('state', state_values[i])
+            if sr is not None:
+                binding.bind_cpu_input('sr', sr)
+            binding.bind_ortvalue_output('output', output_value)
+            binding.bind_ortvalue_output('stateN', state_values[1 - i])
+            bindings.append(binding)
+        self._bindings = tuple(bindings)
+        self._current = 0
+
+    @property
+    def state(self) -> np.ndarray:
+        return self._states[self._current]
+
+    def speech_prob(self, audio_chunk: np.ndarray) -> float:
+        """get_speech_prob for one full window; the state advances only on a successful run."""
+        max_amp = max(audio_chunk.max(), -audio_chunk.min())
+        if max_amp <= self.silence_floor:
+            return 0.0
+        # Normalize audio to range [-1, 1]
+        if max_amp > 1.0 or max_amp < 0.01:
+            np.divide(audio_chunk, max_amp, out=self.input[0])
+        else:
+            np.copyto(self.input[0], audio_chunk)
+        try:
+            self.session.run_with_iobinding(self._bindings[self._current])
+        except Exception as e:
+            logger.error("Inference error. [error=%s]", e)
+            return 0.0
+        self._current ^= 1
+        return float(self.output[0][0])
+
+
+class VADBatcher:
+    """Collects VAD windows submitted by concurrent calls and runs them as one batch."""
+
+    def __init__(self, vad_engine: VADModel, max_batch_size: int = 32, max_wait_ms: float = 3.0):
+        self.vad_engine = vad_engine
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[Tuple[np.ndarray, Optional[np.ndarray], asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    async def submit(self, audio_chunk: np.ndarray, state: Optional[np.ndarray]) -> tuple:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((audio_chunk, state, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            results = self.vad_engine.get_speech_probs([p[0] for p in pending], [p[1] for p in pending])
+        except Exception as e:
+            logger.error("Batched inference error. [error=%s]", e)
+            results = [(0.0, p[1]) for p in pending]
+        for (_, _, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+
+    def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        for _, _, future in pending:
+            if not future.done():
+                future.cancel()
+
+
+class VADWorker:
+    """Runs frame processing for all calls on one native thread, off the asyncio loop.
+
+    ORT releases the GIL during inference, so VAD no longer competes with loop work. Callers that
+    touch loop-owned state from the processing function must hop back with call_soon_threadsafe.
+    """
+
+    OVERFLOW_WARNING_INTERVAL = 5.0  # seconds between overflow warnings, drops in between are summed
+
+    def __init__(self, max_pending: int = 1024):
+        # deque append/popleft are atomic; on overflow the oldest frames are dropped, like PJSIP does
+        self._pending: deque = deque(maxlen=max(1, max_pending))
+        # Each dropped frame leaves a gap in its call's VAD stream, so drops are counted and logged
+        self.dropped = 0
+        self._warned = 0
+        self._last_warning = float('-inf')
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="vad-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn: Callable[[bytes], None], data: bytes):
+        pending = self._pending
+        if len(pending) == pending.maxlen:
+            self._count_overflow()
+        pending.append((fn, data))
+        self._wakeup.set()
+
+    def _count_overflow(self):
+        # Unlocked: concurrent media threads could at worst miscount a drop, never lose or duplicate a frame
+        self.dropped += 1
+        now = time.monotonic()
+        if now - self._last_warning >= self.OVERFLOW_WARNING_INTERVAL:
+            logger.warning("VAD worker queue overflow, oldest frames dropped. [dropped=%s, total_dropped=%s, max_pending=%s]",
+                           self.dropped - self._warned, self.dropped, self._pending.maxlen)
+            self._warned = self.dropped
+            self._last_warning = now
+
+    def _run(self):
+        pending = self._pending
+        wakeup = self._wakeup
+        while not self._stopped:
+            wakeup.wait()
+            wakeup.clear()
+            while pending:
+                fn, data = pending.popleft()
+                try:
+                    fn(data)
+                except Exception as e:
+                    logger.error("VAD worker task failed. [error_type=%s, error=%s]", type(e).__name__, e, exc_info=True)
+
+    def close(self, timeout: float = 1.0):
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._pending.clear()
+
+
+class _SampleBuffer:
+    """Growable float32 sample buffer; appends copy into spare capacity instead of concatenating."""
+
+    __slots__ = ("_data", "_start", "_end")
+
+    def __init__(self, capacity: int):
+        self._data = np.empty(max(1, capacity), dtype=np.float32)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def view(self) -> np.ndarray:
+        """Current samples; the view is only valid until the next append or clear."""
+        return self._data[self._start:self._end]
+
+    def clear(self):
+        self._start = self._end = 0
+
+    def append(self, samples: np.ndarray):
+        n = len(samples)
+        if self._end + n > len(self._data):
+            self._make_room(n)
+        self._data[self._end:self._end + n] = samples
+        self._end += n
+
+    def keep_last(self, n: int):
+        if self._end - self._start > n:
+            self._start = self._end - n
+
+    def _make_room(self, n: int):
+        size = self._end - self._start
+        if size + n <= len(self._data) // 2:
+            # Dropped head: shift the live samples down instead of reallocating
+            self._data[:size] = self._data[self._start:self._end]
+        else:
+            data = np.empty(max(2 * len(self._data), size + n), dtype=np.float32)
+            data[:size] = self._data[self._start:self._end]
+            self._data = data
+        self._start = 0
+        self._end = size
+
 
 class StreamingVADProcessor:
     def __init__(
@@ -134,10 +592,15 @@ class StreamingVADProcessor:
             on_speech_end: Optional[Callable[[np.ndarray, float, float], None]] = None,
             on_short_pause: Optional[Callable[[np.ndarray, float, float], None]] = None,
             on_long_pause: Optional[Callable[[np.ndarray, float, float], None]] = None,
-            on_user_salience_timeout: Optional[Callable[[float], None]] = None
+            on_user_salience_timeout: Optional[Callable[[float], None]] = None,
+            batcher: Optional[VADBatcher] = None
     ):
         # Engine and parameters
         self.vad_engine = vad_engine
+        # Held by VADWorker while processing so loop-side state updates do not interleave with a window
+        self.lock = threading.RLock()
+        self.batcher = batcher
+        self._batch_lock: Optional[asyncio.Lock] = None
         self.threshold = threshold
         self.window_size_samples = window_size_samples
         self.sampling_rate = vad_engine.sampling_rate
@@ -152,13 +615,21 @@ class StreamingVADProcessor:
         self.user_silence_duration_samples = self.sampling_rate * user_silence_duration_ms // 1000
 
         # Buffers
-        self.buffer = np.array([], dtype=np.float32)
-        self.speech_buffer = np.array([], dtype=np.float32)
-        self.silence_buffer = np.array([], dtype=np.float32)
+        # Incoming frames are copied into one preallocated window instead of being concatenated per frame
+        self._window = np.empty(self.window_size_samples, dtype=np.float32)
+        self._window_fill = 0
         self.silence_pad_buffer = np.array([], dtype=np.float32)
         self.max_silence_buffer_duration_ms = max(speech_pad_ms * 2, min_silence_duration_ms)
         self.max_silence_samples = self.sampling_rate * self.max_silence_buffer_duration_ms // 1000
+        # Speech and trailing silence grow in place; the silence buffer is capped at max_silence_samples
+        self._speech = _SampleBuffer(self.sampling_rate * 10)
+        self._silence = _SampleBuffer(2 * (self.max_silence_samples + window_size_samples))
         self.prob_history = deque(maxlen=self.speech_prob_window)
+        # Linear smoothing weights 1..n, the sum is precomputed per history length.
+        # The weighted and plain sums of the history are kept running, so each frame is O(1)
+        self._prob_weight_sums = [n * (n + 1) / 2 for n in range(self.speech_prob_window + 1)]
+        self._prob_weighted_sum = 0.0
+        self._prob_sum = 0.0
 
         # Detection state
         self.current_sample = 0
@@ -179,6 +650,8 @@ class StreamingVADProcessor:
 
         # Initialize ONNX session state for consistent inference
         self.state = self.vad_engine.initialize_state()
+        # Unbatched streams run on their own bound buffers; batched windows carry self.state through the batcher
+        self._stream = self.vad_engine.create_stream(self.state) if batcher is None else None
 
         self.use_dynamic_corrections = os.getenv("VAD_USE_DYNAMIC_CORRECTIONS", "true").lower() == "true"
         cfg = VADCorrectionConfig()
@@ -193,17 +666,37 @@ class StreamingVADProcessor:
             "duration": len(audio_chunk) / self.sampling_rate,
         }
 
+    @property
+    def speech_buffer(self) -> np.ndarray:
+        return self._speech.view()
+
+    @property
+    def silence_buffer(self) -> np.ndarray:
+        return self._silence.view()
+
     def current_time_sec(self):
         return self.current_sample / self.sampling_rate
 
     def _get_smoothed_prob(self, audio_chunk: np.ndarray) -> float:
-        new_prob, self.state = self.vad_engine.get_speech_prob(audio_chunk.copy(), self.state)
-        self.prob_history.append(new_prob)
+        if self._stream is not None and len(audio_chunk) == self.window_size_samples:
+            return self._smooth_prob(self._stream.speech_prob(audio_chunk))
+        new_prob, self.state = self.vad_engine.get_speech_prob(audio_chunk, self.state)
+        return self._smooth_prob(new_prob)
+
+    def _smooth_prob(self, new_prob: float) -> float:
+        history = self.prob_history
+        if len(history) == self.speech_prob_window:
+            # Every weight drops by one, the oldest falls out and the new prob takes weight n
+            self._prob_weighted_sum += self.speech_prob_window * new_prob - self._prob_sum
+            self._prob_sum += new_prob - history[0]
+        else:
+            self._prob_weighted_sum += (len(history) + 1) * new_prob
+            self._prob_sum += new_prob
+        history.append(new_prob)
 
-        if len(self.prob_history) > 1:
-            weights = list(range(1, len(self.prob_history) + 1))
-            weighted_sum = sum(p * w for p, w in zip(self.prob_history, weights))
-            return weighted_sum / sum(weights)
+        n = len(history)
+        if n > 1:
+            return self._prob_weighted_sum / self._prob_weight_sums[n]
 
         return new_prob
 
@@ -211,95 +704,129 @@ class StreamingVADProcessor:
         if audio_chunk.dtype != np.float32:
             raise ValueError(f"Audio chunk must be of type float32. Got {audio_chunk.dtype}")
 
-        self.buffer = np.concatenate([self.buffer, audio_chunk])
-        while len(self.buffer) >= self.window_size_samples:
-            chunk = self.buffer[:self.window_size_samples]
-            self.buffer = self.buffer[self.window_size_samples:]
-            self._process_audio_window(chunk)
+        for window in self._windows(audio_chunk):
+            self._process_audio_window(window)
+
+    def _windows(self, audio_chunk: np.ndarray):
+        """Yield every complete window; the yielded array is reused and only valid until the next one."""
+        window = self._window
+        size = self.window_size_samples
+        offset = 0
+        total = len(audio_chunk)
+        while offset < total:
+            n = min(size - self._window_fill, total - offset)
+            np.copyto(window[self._window_fill:self._window_fill + n], audio_chunk[offset:offset + n])
+            self._window_fill += n
+            offset += n
+            if self._window_fill == size:
+                self._window_fill = 0
+                yield window
+
+    async def process_audio_batched(self, audio_chunk: np.ndarray) -> None:
+        """Like process_audio, but windows go through the shared VADBatcher."""
+        if self.batcher is None:
+            self.process_audio(audio_chunk)
+            return
+        if audio_chunk.dtype != np.float32:
+            raise ValueError(f"Audio chunk must be of type float32. Got {audio_chunk.dtype}")
+        if self._batch_lock is None:
+            self._batch_lock = asyncio.Lock()
+        # Frames of one call must be processed in arrival order while a batch is pending
+        async with self._batch_lock:
+            for window in self._windows(audio_chunk):
+                # The batch reads the window before submit returns, and _windows only refills it after that
+                new_prob, self.state = await self.batcher.submit(window, self.state)
+                self._process_audio_window(window, self._smooth_prob(new_prob))
 
     def finalize(self):
-        if len(self.speech_buffer) >= self.min_speech_samples:
+        if len(self._speech) >= self.min_speech_samples:
             self._fire_long_pause()
 
-    def _process_audio_window(self, window: np.ndarray) -> None:
+    def _process_audio_window(self, window: np.ndarray, speech_prob: Optional[float] = None) -> None:
         # Get speech probability using original method
-        speech_prob = self._get_smoothed_prob(window)
+        if speech_prob is None:
+            speech_prob = self._get_smoothed_prob(window)
         is_basic_speech = speech_prob > self.threshold
         if self.use_dynamic_corrections:
-            frame_energy = float(np.sqrt(np.mean(np.square(window))))
+            # RMS via a dot product avoids the temporary np.square array
+            frame_energy = math.sqrt(float(np.dot(window, window)) / len(window))
             is_speech_frame = self.dc.process_frame(speech_prob, frame_energy)
         else:
             is_speech_frame = is_basic_speech
 
         self.current_sample += len(window)
 
+        speech = self._speech
+        silence = self._silence
         if self.active_long_speech:
-            self.speech_buffer = np.concatenate([self.speech_buffer, window])
+            speech.append(window)
             if is_speech_frame:
-                if len(self.silence_buffer) > 0:
-                    self.silence_buffer = np.array([], dtype=np.float32)
+                silence.clear()
             else:
                 self._grow_silence_buffer(window)
         else:
             if is_speech_frame:
-                self.speech_buffer = np.concatenate([self.speech_buffer, window])
+                speech.append(window)
             else:
-                if len(self.speech_buffer) > 0:
-                    self._grow_silence_buffer(self.speech_buffer)
-                    self.speech_buffer = np.array([], dtype=np.float32)
+                if len(speech) > 0:
+                    self._grow_silence_buffer(speech.view())
+                    speech.clear()
                 self._grow_silence_buffer(window)
 
         if is_speech_frame:
             if not self.active_speech:
                 self.speech_start = self.current_sample - len(window)
-                if len(self.speech_buffer) >= self.min_speech_samples:
+                if len(speech) >= self.min_speech_samples:
                     self._fire_speech_start()
         else: # silence frame
             if self.active_speech:
-                if len(self.silence_buffer) >= self.min_silence_samples:
+                if len(silence) >= self.min_silence_samples:
                     self._fire_speech_end()
             else:
                 if not self.user_silence_timeout_fired and self.current_sample - self.user_silence_start > self.user_silence_duration_samples:
                     self._fire_user_silence_timeout()
             if self.active_long_speech:
-                if not self.short_pause_fired and len(self.silence_buffer) >= self.short_pause_samples:
+                if not self.short_pause_fired and len(silence) >= self.short_pause_samples:
                     self._fire_short_pause()
-                if not self.long_pause_suspended and len(self.silence_buffer) >= self.long_pause_samples:
+                if not self.long_pause_suspended and len(silence) >= self.long_pause_samples:
                     self._fire_long_pause()
 
     def start_user_silence(self) -> None:
-        self.user_silence_start = self.current_sample
-        self.user_silence_timeout_fired = False
-        self.dc.start_early_detection()
+        with self.lock:
+            self.user_silence_start = self.current_sample
+            self.user_silence_timeout_fired = False
+            self.dc.start_early_detection()
         current_time_ms = self.current_sample / self.sampling_rate * 1000
         logger.debug("User salience period started. [time_sec=%.2f]", current_time_ms / 1000)
 
     def reset_user_salience(self) -> None:
         """Disable user salience timeout (prevents it from firing)"""
-        self.user_silence_start = 0
-        self.user_silence_timeout_fired = True
+        with self.lock:
+            self.user_silence_start = 0
+            self.user_silence_timeout_fired = True
 
     def cancel_user_salience(self) -> None:
         """Cancel user salience timeout (when user speaks during timeout period)"""
-        self.user_silence_start = 0
+        with self.lock:
+            self.user_silence_start = 0
         # Don't change user_silence_timeout_fired - let it keep its state
         logger.debug("User salience timeout cancelled. [time_sec=%.2f]", self.current_time_sec())
 
     def _grow_silence_buffer(self, window):
-        self.silence_buffer = np.concatenate([self.silence_buffer, window])
-        if len(self.silence_buffer) > self.max_silence_samples:
-            self.silence_buffer = self.silence_buffer[-self.max_silence_samples:]
+        self._silence.append(window)
+        self._silence.keep_last(self.max_silence_samples)
 
     def _fire_speech_end(self):
         self.active_speech = False
         if not self.active_long_speech:
-            self.speech_buffer = np.array([], dtype=np.float32)
+            self._speech.clear()
         self.short_pause_fired = False
-        self.user_silence_start = self.current_sample - len(self.silence_buffer)
+        self.user_silence_start = self.current_sample - len(self._silence)
         self.user_silence_timeout_fired = False
         start_offset = self.speech_start - self.current_sample
-        end_offset = -len(self.silence_buffer)
-        buffer = self.speech_buffer[start_offset:end_offset]
+        end_offset = -len(self._silence)
+        # Copied out: the speech buffer keeps growing in place after the callback
+        buffer = self._speech.view()[start_offset:end_offset].copy()
         try:
             self.handle_speech_end(buffer, **self.times_sec(buffer))
         except Exception as e:
@@ -309,18 +836,34 @@ class StreamingVADProcessor:
         self.active_speech = True
         if not self.active_long_speech:
             self.active_long_speech = True
-            start_padding = min(self.speech_pad_samples, len(self.silence_buffer))
-            self.silence_pad_buffer = self._apply_fade(self.silence_buffer[-start_padding:])
-        self.silence_buffer = np.array([], dtype=np.float32)
+            start_padding = min(self.speech_pad_samples, len(self._silence))
+            # _apply_fade copies, except for buffers too short to fade
+            pad = self._silence.view()[-start_padding:]
+            self.silence_pad_buffer = self._apply_fade(pad) if len(pad) > 1 else pad.copy()
+        self._silence.clear()
         try:
             self.handle_speech_start(self.silence_pad_buffer, **self.times_sec(self.silence_pad_buffer))
         except Exception as e:
             logger.error("Error firing speech end. [error=%s]", e)
 
+    def _pause_buffer(self) -> np.ndarray:
+        """Speech-start pad, speech and faded-out trailing silence, assembled in a single allocation."""
+        pad = self.silence_pad_buffer
+        silence = self._silence.view()
+        speech = self._speech.view()[:-len(silence)]
+        speech_end = len(pad) + len(speech)
+        buffer = np.empty(speech_end + len(silence), dtype=np.float32)
+        buffer[:len(pad)] = pad
+        buffer[len(pad):speech_end] = speech
+        if len(silence) > 1:
+            # Same curve as _apply_fade(silence, False), written straight into the tail
+            np.multiply(silence, _fade_curve('cosine', len(silence), False), out=buffer[speech_end:])
+        else:
+            buffer[speech_end:] = silence
+        return buffer
+
     def _fire_short_pause(self):
-        silence_length = len(self.silence_buffer)
-        silence_postfix = self._apply_fade(self.silence_buffer, False)
-        buffer = np.concatenate([self.silence_pad_buffer, self.speech_buffer[:-silence_length], silence_postfix])
+        buffer = self._pause_buffer()
         try:
             self.handle_short_pause(buffer, **self.times_sec(buffer))
         except Exception as e:
@@ -328,9 +871,7 @@ class StreamingVADProcessor:
         self.short_pause_fired = True
 
     def _fire_long_pause(self):
-        silence_length = len(self.silence_buffer)
-        silence_postfix = self._apply_fade(self.silence_buffer, False)
-        buffer = np.concatenate([self.silence_pad_buffer, self.speech_buffer[:-silence_length], silence_postfix])
+        buffer = self._pause_buffer()
         try:
             self.handle_long_pause(buffer, **self.times_sec(buffer))
         except Exception as e:
@@ -338,7 +879,7 @@ class StreamingVADProcessor:
         self.short_pause_fired = False
         self.active_long_speech = False
         # self.silence_start = self.current_sample - len(self.silence_buffer)
-        self.speech_buffer = np.array([], dtype=np.float32)
+        self._speech.clear()
 
     def _fire_user_silence_timeout(self):
         try:
@@ -353,26 +894,7 @@ class StreamingVADProcessor:
         fade_length = len(audio)
         if fade_length <= 1:
             return audio
-        result = audio.copy()
-
-        # Create fade curve based on selected type
-        if curve == 'linear':
-            fade_curve = np.linspace(0.0, 1.0, fade_length)
-        elif curve == 'cosine':
-            fade_curve = np.sin(np.linspace(0, np.pi / 2, fade_length))
-        elif curve == 'exponential':
-            fade_curve = np.exp(np.linspace(-4, 0, fade_length)) - np.exp(-4)
-            fade_curve = fade_curve / fade_curve[-1]  # Normalize to 0-1 range
-        elif curve == 'log':
-            fade_curve = np.log(np.linspace(0.1, 1, fade_length) * 9 + 1)
-            fade_curve = fade_curve / fade_curve[-1]  # Normalize to 0-1 range
-        else:
-            raise ValueError(f"Wrong curve {curve}")
-
-        if not fade_in:
-            fade_curve = fade_curve[::-1]
-        result[:fade_length] *= fade_curve
-        return result
+        return np.multiply(audio, _fade_curve(curve, fade_length, fade_in), dtype=audio.dtype)
 
     def handle_speech_start(self, silence_pad_buffer: np.ndarray, start: float, duration: float):
         logger.debug("Speech start detected. [current_time_sec=%.2f, start_sec=%.2f, duration_sec=%.2f]",
@@ -1,13 +1,20 @@
-import statistics
 from collections import deque
 from dataclasses import dataclass, field
-from typing import Deque, Tuple, List
+from typing import Deque, Tuple, List, Sequence
+import heapq
 import logging
 
 __all__ = ["VADCorrectionConfig", "DynamicCorrection"]
 
 logger = logging.getLogger(__name__)
 
+
+def _pvariance(data: Sequence[float]) -> float:
+    """Population variance in plain floats; statistics.pvariance does exact Fraction arithmetic."""
+    n = len(data)
+    mean = sum(data) / n
+    return sum((x - mean) * (x - mean) for x in data) / n
+
 @dataclass
 class VADCorrectionConfig:
     """Configuration for foreground speech detection."""
@@ -62,15 +69,28 @@ class DynamicCorrection:
 
     def __init__(self, cfg: VADCorrectionConfig | None = None):
         self.cfg = cfg or VADCorrectionConfig()
+        # Feature weights and their normalisation are fixed for the life of the instance
+        self._weights: Tuple[float, float, float, float] = (
+            self.cfg.w_prob, self.cfg.w_snr, self.cfg.w_var, self.cfg.w_energy)
+        weight_sum = sum(self._weights)
+        self._inv_weight_sum = 1.0 / weight_sum if weight_sum else 1.0
 
         # Rolling buffers
         self._score_buf: Deque[float] = deque(maxlen=self.cfg.score_window)
+        self._score_sum: float = 0.0
         self._prob_buf: Deque[float] = deque(maxlen=self.cfg.prob_window)
+        # Count, sum and sum of squares of the speech-level probs in _prob_buf, kept as they enter and leave
+        self._fg_count: int = 0
+        self._fg_sum: float = 0.0
+        self._fg_sum2: float = 0.0
 
         # Energy tracking with better initial estimates
         self._noise_energy: float = 0.01  # Start lower for better sensitivity
         self._peak_energy: float = 0.1
-        self._initial_energy_samples: List[float] = []  # Collect samples for better initial estimate
+        # Preallocated for the first initial_adapt_frames energies, dropped once the noise estimate is set
+        self._initial_energy_samples: List[float] | None = \
+            [0.0] * self.cfg.initial_adapt_frames if self.cfg.initial_adapt_frames > 0 else None
+        self._initial_energy_count: int = 0
 
         # State
         self._state: bool = False
@@ -79,12 +99,14 @@ class DynamicCorrection:
         # Early detection state
         self._in_early_phase: bool = False
         self._early_phase_start_frame: int = -1
+        self._early_phase_end_frame: int = -1
 
     def start_early_detection(self) -> None:
         """Call this when agent finishes speaking and we expect user input."""
         if self._early_phase_start_frame == -1:
             self._in_early_phase = True
             self._early_phase_start_frame = self.frame_index
+            self._early_phase_end_frame = self.frame_index + self.cfg.early_phase_frames
 
     @staticmethod
     def _clip_norm(x: float, lo: float, hi: float) -> float:
@@ -99,11 +121,14 @@ class DynamicCorrection:
         cfg = self.cfg
 
         # Collect initial samples for better noise estimation
-        if len(self._initial_energy_samples) < cfg.initial_adapt_frames:
-            self._initial_energy_samples.append(eng)
-            if len(self._initial_energy_samples) == cfg.initial_adapt_frames:
-                # Set initial noise to 10th percentile of first samples
-                self._noise_energy = sorted(self._initial_energy_samples)[len(self._initial_energy_samples) // 10]
+        samples = self._initial_energy_samples
+        if samples is not None:
+            samples[self._initial_energy_count] = eng
+            self._initial_energy_count += 1
+            if self._initial_energy_count == len(samples):
+                # Set initial noise to 10th percentile of first samples, without sorting all of them
+                self._noise_energy = heapq.nsmallest(len(samples) // 10 + 1, samples)[-1]
+                self._initial_energy_samples = None
 
         # Use faster adaptation during initial phase
         alpha = cfg.initial_noise_alpha if self.frame_index < cfg.initial_adapt_frames else cfg.noise_alpha
@@ -123,50 +148,72 @@ class DynamicCorrection:
         if len(self._prob_buf) < 4:
             return False
 
-        recent = list(self._prob_buf)[-4:]
+        buf = self._prob_buf
+        recent = (buf[-4], buf[-3], buf[-2], buf[-1])
         prob_range = max(recent) - min(recent)
         return prob_range > self.cfg.transition_threshold
 
-    def _calculate_foreground_variance(self) -> Tuple[float, float]:
-        """
-        Calculate variance that represents genuine speech dynamics.
-        Returns: (raw_variance, foreground_variance)
-        """
+    def _push_prob(self, prob: float) -> None:
+        """Append to the prob window, updating the running speech-level sums."""
+        buf = self._prob_buf
+        threshold = self.cfg.speech_prob_threshold
+        if len(buf) == buf.maxlen:
+            old = buf[0]
+            if old > threshold:
+                self._fg_count -= 1
+                if self._fg_count:
+                    self._fg_sum -= old
+                    self._fg_sum2 -= old * old
+                else:
+                    # Restart from exact zeros whenever the window holds no speech, so rounding cannot accumulate
+                    self._fg_sum = self._fg_sum2 = 0.0
+        buf.append(prob)
+        if prob > threshold:
+            self._fg_count += 1
+            self._fg_sum += prob
+            self._fg_sum2 += prob * prob
+
+    def _calculate_raw_variance(self) -> float:
+        """Variance of all recent probabilities, only reported in debug output."""
         if len(self._prob_buf) < 2:
-            return 0.0, 0.0
-
-        # Calculate raw variance (for comparison)
-        raw_variance = statistics.pvariance(self._prob_buf)
+            return 0.0
+        return _pvariance(self._prob_buf)
 
-        # Get recent probabilities for foreground analysis
-        recent_probs = list(self._prob_buf)
+    def _calculate_foreground_variance(self) -> float:
+        """Calculate variance that represents genuine speech dynamics."""
+        # During silence, no foreground speech activity
+        if not self._state or len(self._prob_buf) < 2:
+            return 0.0
 
         # Strategy 1: State-conditional variance calculation
-        if self._state:  # Currently detecting speech
-            # Only use speech-level probabilities for variance
-            speech_probs = [p for p in recent_probs if p > self.cfg.speech_prob_threshold]
-
-            if len(speech_probs) >= self.cfg.min_speech_frames:
-                # Calculate variance only from speech frames
-                foreground_var = statistics.pvariance(speech_probs)
-
-                # Additional check: avoid transition contamination
-                if self._is_transition_period():
-                    # During transitions, use a more conservative approach
-                    # Look at the most recent speech frames only
-                    recent_speech = [p for p in recent_probs[-6:] if p > self.cfg.speech_prob_threshold]
-                    if len(recent_speech) >= 3:
-                        foreground_var = statistics.pvariance(recent_speech)
-                    else:
-                        foreground_var = 0.0  # Insufficient clean speech data
-
-                return raw_variance, foreground_var
-            else:
-                # Not enough speech frames for reliable variance
-                return raw_variance, 0.0
-        else:
-            # During silence, no foreground speech activity
-            return raw_variance, 0.0
+        # Only use speech-level probabilities for variance
+        n = self._fg_count
+        if n < self.cfg.min_speech_frames:
+            # Not enough speech frames for reliable variance
+            return 0.0
+
+        # Additional check: avoid transition contamination
+        if self._is_transition_period():
+            # During transitions, use a more conservative approach
+            # Look at the most recent speech frames only
+            buf = self._prob_buf
+            threshold = self.cfg.speech_prob_threshold
+            # One pass over the last six probs, accumulating the speech-level ones without building a list
+            count, total, total2 = 0, 0.0, 0.0
+            for i in range(max(0, len(buf) - 6), len(buf)):
+                p = buf[i]
+                if p > threshold:
+                    count += 1
+                    total += p
+                    total2 += p * p
+            if count >= 3:
+                mean = total / count
+                return max(total2 / count - mean * mean, 0.0)
+            return 0.0  # Insufficient clean speech data
+
+        # Calculate variance only from speech frames, from the running sums
+        mean = self._fg_sum / n
+        return max(self._fg_sum2 / n - mean * mean, 0.0)
 
     def _apply_early_detection_boost(self, speech_prob: float) -> float:
         """Apply early detection boost during initial conversation phase."""
@@ -177,19 +224,9 @@ class DynamicCorrection:
         boosted_prob = speech_prob + self.cfg.early_prob_boost
         return min(boosted_prob, 1.0)
 
-    def _get_dynamic_threshold(self) -> float:
-        """Get threshold based on conversation phase and detection history."""
-        cfg = self.cfg
-
-        # Use lower threshold during early phase
-        if self._in_early_phase:
-            return cfg.early_enter_thres
-
-        # Fallback to standard threshold
-        return cfg.enter_thres
-
     def process_frame(self, speech_prob: float, frame_energy: float) -> bool:
         """Process frame and return speech detection result."""
+        cfg = self.cfg
 
         # Update energy profile
         self._update_energy_profile(frame_energy, speech_prob)
@@ -199,14 +236,13 @@ class DynamicCorrection:
 
         # Calculate features
         snr = frame_energy / (self._noise_energy + 1e-6)
-        snr_n = self._clip_norm(snr, *self.cfg.snr_clip)
+        snr_n = self._clip_norm(snr, *cfg.snr_clip)
 
-        self._prob_buf.append(adjusted_prob)
+        self._push_prob(adjusted_prob)
 
         # Calculate foreground-aware variance
-        raw_var, foreground_var = self._calculate_foreground_variance()
-        var_n = self._clip_norm(raw_var, *self.cfg.var_clip)
-        fg_var_n = self._clip_norm(foreground_var, *self.cfg.var_clip)
+        foreground_var = self._calculate_foreground_variance()
+        fg_var_n = self._clip_norm(foreground_var, *cfg.var_clip)
 
         # Energy normalization with better handling for early frames
         if self._peak_energy > self._noise_energy:
@@ -216,37 +252,38 @@ class DynamicCorrection:
         eng_n = min(max(eng_n, 0.0), 1.0)
 
         # Calculate score using foreground variance
-        cfg = self.cfg
+        w_prob, w_snr, w_var, w_energy = self._weights
         score = (
-                cfg.w_prob * adjusted_prob +
-                cfg.w_snr * snr_n +
-                cfg.w_var * fg_var_n +  # Use foreground variance instead of raw
-                cfg.w_energy * eng_n
-        )
-
-        weight_sum = cfg.w_prob + cfg.w_snr + cfg.w_var + cfg.w_energy
-        score /= weight_sum if weight_sum else 1.0
+                w_prob * adjusted_prob +
+                w_snr * snr_n +
+                w_var * fg_var_n +  # Use foreground variance instead of raw
+                w_energy * eng_n
+        ) * self._inv_weight_sum
 
         # Update rolling score and state with dynamic threshold
-        self._score_buf.append(score)
-        mean_score = sum(self._score_buf) / len(self._score_buf)
-
-        dynamic_enter_threshold = self._get_dynamic_threshold()
-
-        if not self._state and mean_score >= dynamic_enter_threshold:
-            self._state = True
-        elif self._state and mean_score <= cfg.exit_thres:
-            self._state = False
-
-        if self._in_early_phase:
-            if self._state:
-                self._in_early_phase = False
-            elif (self._early_phase_start_frame >= 0 and
-                  self.frame_index >= self._early_phase_start_frame + self.cfg.early_phase_frames):
-                self._in_early_phase = False
+        score_buf = self._score_buf
+        if len(score_buf) == score_buf.maxlen:
+            self._score_sum -= score_buf[0]
+        score_buf.append(score)
+        self._score_sum += score
+        mean_score = self._score_sum / len(score_buf)
+
+        # Hysteresis; the enter threshold is lower during the early phase
+        state = self._state
+        early = self._in_early_phase
+        if state:
+            if mean_score <= cfg.exit_thres:
+                state = self._state = False
+        elif mean_score >= (cfg.early_enter_thres if early else cfg.enter_thres):
+            state = self._state = True
+
+        # The early phase ends on the first detected speech or after early_phase_frames
+        if early and (state or self.frame_index >= self._early_phase_end_frame):
+            self._in_early_phase = False
 
         # Debug output
         if cfg.debug:
+            var_n = self._clip_norm(self._calculate_raw_variance(), *cfg.var_clip)
             early_indicator = " [EARLY]" if self._in_early_phase else ""
             debug_message = cfg.dbg_fmt.format(
                 f=self.frame_index,
@@ -1,20 +1,139 @@
 import asyncio
+import functools
 import logging
 import os
 import struct
-from typing import List
+from typing import Any, Callable, List, Literal, Optional, Tuple, Union
 
-import aiofiles
+import numpy as np
+
+from src.integrations.sip.audio_utils import to_pcm16, wav_header
 
 logger = logging.getLogger(__name__)
 
+# Little-endian RIFF and data size fields patched on close
+_SIZE_FIELD = struct.Struct('<I')
+# Buffers per writev call; POSIX guarantees at least 1024 on Linux
+_IOV_MAX = 1024
+
+# Any C-contiguous bytes-like chunk; memoryviews of other formats are written as their raw bytes
+Chunk = Union[bytes, bytearray, memoryview]
+
+
+def _nbytes(chunk: Chunk) -> int:
+    return chunk.nbytes if isinstance(chunk, memoryview) else len(chunk)
+
+
+class _FileOpBatcher:
+    """Runs the blocking file operations of all writers in as few executor hops as possible.
+
+    Operations submitted during one event loop iteration, typically buffer flushes of several
+    concurrent call recordings, are executed back to back by a single executor job. Each writer
+    awaits its own operation, so per-file order is unchanged. With linger_ms the job starts that
+    long after the first submission, collecting operations from several loop iterations.
+    """
+
+    def __init__(self, linger_ms: float = 0.0):
+        self.linger = linger_ms / 1000
+        self._pending: List[Tuple[Callable, tuple, asyncio.Future]] = []
+        self._scheduled = False
+
+    async def run(self, fn: Callable, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((fn, args, future))
+        if not self._scheduled:
+            self._scheduled = True
+            if self.linger > 0:
+                loop.call_later(self.linger, self._dispatch, loop)
+            else:
+                loop.call_soon(self._dispatch, loop)
+        return await future
+
+    def _dispatch(self, loop: asyncio.AbstractEventLoop):
+        batch, self._pending = self._pending, []
+        self._scheduled = False
+        job = loop.run_in_executor(None, self._run_batch, batch)
+        job.add_done_callback(lambda done: self._resolve(batch, done))
+
+    @staticmethod
+    def _run_batch(batch: List[Tuple[Callable, tuple, asyncio.Future]]) -> List[Tuple[bool, Any]]:
+        results = []
+        for fn, args, _ in batch:
+            try:
+                results.append((True, fn(*args)))
+            except Exception as e:
+                results.append((False, e))
+        return results
+
+    @staticmethod
+    def _resolve(batch: List[Tuple[Callable, tuple, asyncio.Future]], done: asyncio.Future):
+        if done.cancelled():
+            outcomes = [(False, asyncio.CancelledError())] * len(batch)
+        elif done.exception() is not None:
+            outcomes = [(False, done.exception())] * len(batch)
+        else:
+            outcomes = done.result()
+        for (_, _, future), (ok, value) in zip(batch, outcomes):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+
+_FILE_OPS = _FileOpBatcher()
+
+
+def _sync_and_close(f):
+    try:
+        # fdatasync skips timestamp-only metadata; the data blocks and the file size are flushed
+        getattr(os, 'fdatasync', os.fsync)(f.fileno())
+    finally:
+        f.close()
+
+
+# Recordings that end together, e.g. a burst of hang-ups, are synced back to back by one job
+_GROUP_SYNC = _FileOpBatcher(linger_ms=5.0)
+
+
+class FramePool:
+    """Recycles fixed-capacity bytearrays for batches of audio frames.
+
+    Buffers are returned without being cleared, because clearing a bytearray releases its
+    storage; callers track how many bytes of a buffer are filled and overwrite it in place.
+    Only bytearrays of exactly size bytes are kept, so a buffer that grew past its capacity is
+    left to the garbage collector.
+    """
+
+    def __init__(self, size: int, max_free: int = 4):
+        self.size = size
+        self.max_free = max_free
+        self._free: List[bytearray] = []
+
+    def acquire(self) -> bytearray:
+        try:
+            return self._free.pop()
+        except IndexError:
+            return bytearray(self.size)
+
+    def release(self, buf: bytearray):
+        if type(buf) is not bytearray:
+            # A view or a bytes object handed out by acquire would be written through by the next user
+            raise TypeError(f"Only pooled bytearrays can be released, got {type(buf).__name__}")
+        if len(buf) == self.size and len(self._free) < self.max_free:
+            self._free.append(buf)
+
 
 class AsyncWavWriter:
     """
     Asynchronous WAV file writer that enables writing audio data chunks incrementally.
 
     This class handles proper WAV header creation and updating, supporting various
-    audio configurations.
+    audio configurations. Chunks are collected in memory and written by an unbuffered
+    file once WRITE_BUFFER_SIZE bytes are pending; the writes of concurrent writers
+    share executor hops through _FILE_OPS.
     """
 
     # WAV format constants
@@ -25,7 +144,12 @@ class AsyncWavWriter:
     DATA_SIZE_OFFSET = 40
     HEADER_SIZE = 44  # Total size of the WAV header
 
-    def __init__(self, filename: str, channels: int, sampwidth: int, framerate: int):
+    WRITE_BUFFER_SIZE = 64 * 1024  # Pending bytes that trigger a write, about 2 s of 16 kHz mono PCM16
+
+    def __init__(self, filename: str, channels: int, sampwidth: int, framerate: int,
+                 expected_duration_sec: float = 0.0,
+                 release_cb: Optional[Callable[[bytearray], None]] = None,
+                 fsync_on_close: bool = False):
         """
         Initialize the WAV writer.
 
@@ -34,6 +158,9 @@ class AsyncWavWriter:
             channels: Number of audio channels (1=mono, 2=stereo)
             sampwidth: Sample width in bytes (1, 2, or 4)
             framerate: Audio sample rate in Hz
+            expected_duration_sec: Audio length to preallocate on disk at open, 0 to grow the file as written
+            release_cb: Called with each buffer passed to write_pooled once its bytes are copied, so it can be recycled
+            fsync_on_close: Sync the file to disk before close returns, grouped with other closing writers
 
         Raises:
             ValueError: If invalid audio parameters are provided
@@ -50,9 +177,19 @@ class AsyncWavWriter:
         self.channels = channels
         self.sampwidth = sampwidth
         self.framerate = framerate
+        self.expected_duration_sec = expected_duration_sec
+        self.release_cb = release_cb
+        self.fsync_on_close = fsync_on_close
         self.data_size = 0
+        self._preallocated = False
+        self._write_pos = 0
+        self._buffer = bytearray()
+        # write_float_chunk conversion buffers, grown to the longest chunk seen
+        self._float_scratch = np.empty(0, dtype=np.float32)
+        self._pcm16_scratch = np.empty(0, dtype='<i2')
         self._file = None
-        self._data_written = False
+        # 'open' only once the header is written; a closed writer is never reopened, which would truncate it
+        self._state: Literal['new', 'open', 'closed'] = 'new'
 
         # Calculate derived values
         self.byte_rate = self.framerate * self.channels * self.sampwidth
@@ -70,99 +207,225 @@ class AsyncWavWriter:
 
     async def open(self):
         """Open the WAV file and write initial header."""
-        if self._file is None:
+        if self._state == 'new':
             logger.debug("Opening WAV file for writing. [filename=%s]", self.filename)
-            self._file = await aiofiles.open(self.filename, 'wb')
-            await self._write_wav_header()
+            self._file = await _FILE_OPS.run(self._open_file)
+            self._state = 'open'
+        elif self._state == 'closed':
+            raise ValueError("Cannot reopen a closed WAV file")
 
-    async def write_chunk(self, chunk: bytes):
+    async def write_chunk(self, chunk: Chunk, length: Optional[int] = None):
         """
         Write an audio data chunk to the WAV file.
 
         Args:
-            chunk: Audio data bytes to write
+            chunk: Audio data to write; pass memoryview(payload)[offset:] rather than a slice of
+                the payload, the bytes are copied only once, into the write buffer
+            length: Number of leading bytes of chunk to write, all of it by default; the chunk
+                stays the caller's and is not passed to release_cb
         """
-        if not chunk:
-            logger.warning("Attempt to write empty chunk. [filename=%s]", self.filename)
+        nbytes = _nbytes(chunk)
+        if length is None:
+            length = nbytes
+        if not length:
+            # Nothing to do; callers skipping silent frames may pass empty chunks at frame rate
             return
 
         if self._file is None:
             raise ValueError("Cannot write to file before opening")
 
-        # Track current position to verify writes
-        current_pos = await self._file.tell()
-        expected_pos = current_pos + len(chunk)
+        if length == nbytes:
+            self._buffer += chunk
+        else:
+            # The view is released before returning, so the caller may refill the chunk right away
+            with memoryview(chunk).cast('B')[:length] as view:
+                self._buffer += view
+        self.data_size += length
+        if len(self._buffer) >= self.WRITE_BUFFER_SIZE:
+            await self._flush_buffer()
+
+    async def write_pooled(self, buf: bytearray, length: int):
+        """
+        Write the first length bytes of a pooled buffer, then hand the buffer to release_cb.
 
-        # Write the chunk data
-        await self._file.write(chunk)
-        self.data_size += len(chunk)
-        self._data_written = True
+        Args:
+            buf: Buffer taken from the caller's pool; it is released even if the write fails
+            length: Number of leading bytes of buf holding audio
+        """
+        try:
+            await self.write_chunk(buf, length)
+        finally:
+            if self.release_cb is not None:
+                self.release_cb(buf)
 
-        # Verify position after write
-        new_pos = await self._file.tell()
-        if new_pos != expected_pos:
-            logger.warning(
-                "File position mismatch after write. [expected=%s, actual=%s, filename=%s]",
-                expected_pos, new_pos, self.filename
-            )
-
-    async def write_chunks(self, chunks: List[bytes]):
+    async def write_float_chunk(self, samples: np.ndarray):
+        """
+        Write float audio in [-1, 1] as PCM16, converted in two vectorized passes into reusable buffers.
+
+        Args:
+            samples: Float samples, interleaved if there are several channels
+        """
+        if self.sampwidth != 2:
+            raise ValueError("Float chunks can only be written to 16-bit WAV files")
+        n = len(samples)
+        if len(self._pcm16_scratch) < n:
+            self._float_scratch = np.empty(n, dtype=np.float32)
+            self._pcm16_scratch = np.empty(n, dtype='<i2')
+        pcm16 = to_pcm16(samples, out=self._pcm16_scratch[:n], scratch=self._float_scratch[:n])
+        if not n:
+            return
+        if self._file is None:
+            raise ValueError("Cannot write to file before opening")
+        # The scratch belongs to the writer, so it is appended here rather than through write_chunk:
+        # nothing about it may reach release_cb, and it can be reused as soon as it is copied
+        self._buffer += memoryview(pcm16).cast('B')
+        self.data_size += pcm16.nbytes
+        if len(self._buffer) >= self.WRITE_BUFFER_SIZE:
+            await self._flush_buffer()
+
+    async def write_chunks(self, chunks: List[Chunk]):
         """
         Write multiple audio data chunks efficiently.
 
+        Chunks are never passed to release_cb: the largest batches are handed to writev as they
+        are, so they stay referenced until the write completes. Use write_pooled for pooled buffers.
+
         Args:
             chunks: List of audio data byte chunks
         """
         if self._file is None:
             raise ValueError("Cannot write to file before opening")
 
-        for chunk in chunks:
-            await self.write_chunk(chunk)
+        chunks = [chunk for chunk in chunks if _nbytes(chunk)]
+        if not chunks:
+            return
+        total = sum(map(_nbytes, chunks))
+        self.data_size += total
+        if len(self._buffer) + total < self.WRITE_BUFFER_SIZE or not hasattr(os, 'writev'):
+            # Small batches go into the pending buffer, which is written once it is full
+            for chunk in chunks:
+                self._buffer += chunk
+            if len(self._buffer) >= self.WRITE_BUFFER_SIZE:
+                await self._flush_buffer()
+            return
+        # A batch that fills the buffer anyway is written with the pending bytes in one writev,
+        # the kernel gathering from the chunks without copying them into a contiguous buffer
+        data, self._buffer = self._buffer, bytearray()
+        buffers = [data, *chunks] if data else chunks
+        await _FILE_OPS.run(self._write_vectored, buffers)
 
     async def close(self):
-        if self._file:
-            logger.debug("Flushing file. [filename=%s]", self.filename)
-            await self._file.flush()
+        state, self._state = self._state, 'closed'
+        if state != 'open':
+            return
+        logger.debug("Flushing file. [filename=%s]", self.filename)
+        data, self._buffer = self._buffer, bytearray()
+        f = self._file
+        try:
+            # Pending data, header sizes and close in a single executor hop; runs at most once
+            await _FILE_OPS.run(self._finish, data, not self.fsync_on_close)
+            if self.fsync_on_close:
+                await _GROUP_SYNC.run(_sync_and_close, f)
+        finally:
+            self._file = None
 
+    async def _flush_buffer(self):
+        data, self._buffer = self._buffer, bytearray()
+        await _FILE_OPS.run(self._write_data, data)
+
+    def _open_file(self):
+        # Unbuffered: the writer coalesces on its own, so a BufferedWriter would only add a copy and
+        # make every raw-fd operation (writev, fallocate, ftruncate) wait for a flush first
+        f = open(self.filename, 'wb', buffering=0)
+        try:
+            self._write_all(f, self._wav_header())
+        except BaseException:
+            f.close()
+            raise
+        self._write_pos = self.HEADER_SIZE
+        if self.expected_duration_sec > 0:
+            self._preallocate(f)
+        return f
+
+    def _preallocate(self, f):
+        """Reserve the expected size in one extent allocation; the file is truncated to the real size on close."""
+        size = self.HEADER_SIZE + int(self.expected_duration_sec * self.byte_rate)
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+            self._preallocated = True
+        except (AttributeError, OSError) as e:
+            # Not available on this platform or file system; the file simply grows as written
+            logger.debug("WAV preallocation skipped. [filename=%s, size=%s, error=%s]", self.filename, size, e)
+
+    @staticmethod
+    def _write_all(f, data: Chunk):
+        # A raw file may accept fewer bytes than offered
+        view = memoryview(data).cast('B')
+        offset = 0
+        while offset < len(view):
+            offset += f.write(view[offset:])
+
+    def _write_data(self, data: bytearray):
+        self._write_all(self._file, data)
+        self._write_pos += len(data)
+        self._check_position()
+
+    def _write_vectored(self, buffers: List[Chunk]):
+        fd = self._file.fileno()
+        views = [memoryview(buf).cast('B') for buf in buffers]
+        i = 0
+        while i < len(views):
+            written = os.writev(fd, views[i:i + _IOV_MAX])
+            self._write_pos += written
+            # Skip the buffers written in full and resume a partially written one where it stopped
+            while i < len(views) and written >= len(views[i]):
+                written -= len(views[i])
+                i += 1
+            if written:
+                views[i] = views[i][written:]
+        self._check_position()
+
+    def _check_position(self):
+        # Verify position after write
+        if logger.isEnabledFor(logging.DEBUG):
+            new_pos = self._file.tell()
+            if new_pos != self._write_pos:
+                logger.warning(
+                    "File position mismatch after write. [expected=%s, actual=%s, filename=%s]",
+                    self._write_pos, new_pos, self.filename
+                )
+
+    def _finish(self, data: bytearray, close: bool = True):
+        f = self._file
+        ok = False
+        try:
+            if data:
+                self._write_data(data)
+            if self._preallocated:
+                os.ftruncate(f.fileno(), self.HEADER_SIZE + self.data_size)
             if self.data_size > 0:
-                # Correct header safely in place
-                async with aiofiles.open(self.filename, 'r+b') as f:
-                    riff_chunk_size = 36 + self.data_size
-                    await f.seek(self.RIFF_SIZE_OFFSET)
-                    await f.write(struct.pack('<I', riff_chunk_size))
-                    await f.seek(self.DATA_SIZE_OFFSET)
-                    await f.write(struct.pack('<I', self.data_size))
-                    await f.flush()
-
-            logger.debug("Closing file. [filename=%s]", self.filename)
-            await self._file.close()
-            self._file = None
+                # Correct header safely in place; pwrite takes the offset, so there is nothing to seek
+                riff_chunk_size = 36 + self.data_size
+                fd = f.fileno()
+                os.pwrite(fd, _SIZE_FIELD.pack(riff_chunk_size), self.RIFF_SIZE_OFFSET)
+                os.pwrite(fd, _SIZE_FIELD.pack(self.data_size), self.DATA_SIZE_OFFSET)
+            ok = True
+        finally:
+            # With fsync_on_close a finished file is closed by _GROUP_SYNC once it is synced
+            if close or not ok:
+                logger.debug("Closing file. [filename=%s]", self.filename)
+                f.close()
+
+    def _wav_header(self) -> bytes:
+        """Initial WAV header with placeholder sizes, built once per audio format."""
+        return _initial_wav_header(self.channels, self.framerate, self.sampwidth)
+
+
+@functools.lru_cache(maxsize=8)
+def _initial_wav_header(channels: int, framerate: int, sampwidth: int) -> bytes:
+    # Size fields are placeholders, patched on close
+    return wav_header(0, framerate, channels, sampwidth)
 
-    async def _write_wav_header(self):
-        """Write the initial WAV header with placeholder sizes."""
-        # Initial size will be updated later
-        riff_chunk_size = 36  # Placeholder, will be updated on close
-        fmt_chunk_size = 16  # Size of the format subchunk for PCM
-
-        header = (
-                b'RIFF' +
-                struct.pack('<I', riff_chunk_size) +
-                b'WAVE' +
-                b'fmt ' +
-                struct.pack('<IHHIIHH',
-                            fmt_chunk_size,  # Subchunk1Size (PCM)
-                            self.PCM_FORMAT,  # AudioFormat (1=PCM)
-                            self.channels,  # NumChannels
-                            self.framerate,  # SampleRate
-                            self.byte_rate,  # ByteRate
-                            self.block_align,  # BlockAlign
-                            self.bits_per_sample  # BitsPerSample
-                            ) +
-                b'data' +
-                struct.pack('<I', 0)  # Data size placeholder
-        )
-        await self._file.write(header)
-        await self._file.flush()  # Ensure header is written
 
 # Example usage with context manager:
 async def main():
@@ -186,6 +449,27 @@ async def main():
     expected_size = 44 + sum(len(chunk) for chunk in chunks)
     logger.info("File created. [size=%s, expected=%s]", file_size, expected_size)
 
+    # Pooled, float and plain writes mixed on one writer: only the pooled buffer goes back to the pool,
+    # and the file matches one written from the same audio converted up front
+    pool = FramePool(1920)
+    pooled = pool.acquire()
+    pooled[:] = b'\x01\x02' * 960
+    samples = np.sin(np.linspace(0, 40 * np.pi, 960, dtype=np.float32)) * np.float32(1.2)
+    async with AsyncWavWriter('output_mixed.wav', channels=1, sampwidth=2, framerate=16000,
+                              release_cb=pool.release) as writer:
+        await writer.write_pooled(pooled, len(pooled))
+        await writer.write_float_chunk(samples)
+        await writer.write_chunk(memoryview(bytearray(1920)))
+        await writer.write_float_chunk(samples[:480])
+    assert all(buf is pooled for buf in pool._free), "Writer released a buffer it does not own"
+    async with AsyncWavWriter('output_reference.wav', channels=1, sampwidth=2, framerate=16000) as writer:
+        await writer.write_chunk(b'\x01\x02' * 960)
+        await writer.write_chunk(to_pcm16(samples).tobytes())
+        await writer.write_chunk(bytes(1920))
+        await writer.write_chunk(to_pcm16(samples[:480]).tobytes())
+    with open('output_mixed.wav', 'rb') as mixed, open('output_reference.wav', 'rb') as reference:
+        assert mixed.read() == reference.read(), "Float writes differ from write_chunk(to_pcm16(x).tobytes())"
+    logger.info("Mixed writes done. [size=%s, expected=%s]", os.path.getsize('output_mixed.wav'), 44 + 3 * 1920 + 960)
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file